@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+barrido.py
+------------
+
+Búsqueda de los parámetros del temple simulado (familia de
+calendarización, T_ini, tol y el dmax de vecino_aleatorio) que dan el
+mejor costo en el menor tiempo.
+
+Las configuraciones se dan como una rejilla o como una muestra aleatoria,
+y se prueban en paralelo por reducción sucesiva a la mitad (successive
+halving): en cada ronda se ejecuta cada configuración con algunas
+semillas y un presupuesto de evaluaciones, y solo la mejor fracción 1/eta
+pasa a la siguiente ronda, con eta veces más presupuesto. Cada ejecución
+se escribe en cuanto termina, en JSONL o CSV según la extensión:
+
+$python barrido.py grafo -o barrido.jsonl
+$python barrido.py nreinas -n 100 --muestra 20 -o barrido.csv
+
+"""
+
+import argparse
+import copy
+import csv
+import itertools
+import json
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import blocales
+
+
+# Familias de calendarización: cada una recibe T_ini y sus parámetros
+CALENDARIOS = {
+    'inverso': lambda T_ini: (T_ini / (1 + i) for i in itertools.count()),
+    'geometrico': blocales.calendario_geometrico,
+    'lundy_mees': blocales.calendario_lundy_mees,
+    'logaritmico': blocales.calendario_logaritmico,
+    'adaptativo': blocales.CalendarioAdaptativo,
+}
+
+# Rejilla por default (T_ini None es la temperatura de calibra_temperatura)
+REJILLA = {
+    'calendario': ['inverso', 'geometrico', 'lundy_mees', 'adaptativo'],
+    'T_ini': [None, 1.0, 10.0],
+    'tol': [0.001, 0.01],
+    'dmax': [5, 10, 25, 50],
+}
+
+# Llaves de una configuración que no son parámetros de la calendarización
+LLAVES = ('calendario', 'T_ini', 'tol', 'dmax')
+
+
+def rejilla(**valores):
+    """
+    Todas las combinaciones de los valores de cada parámetro
+
+    @param valores: Listas de valores por parámetro, como en REJILLA
+
+    @return: Una lista de configuraciones (diccionarios)
+
+    """
+    nombres = sorted(valores)
+    return [dict(zip(nombres, combinacion))
+            for combinacion in itertools.product(*(valores[nombre]
+                                                   for nombre in nombres))]
+
+
+def muestra(n, semilla=0, **rangos):
+    """
+    Configuraciones aleatorias
+
+    @param n: Número de configuraciones
+    @param semilla: Semilla del generador
+    @param rangos: Por parámetro, una lista de valores de donde se elige
+                   uno, o una tupla (min, max) de donde se toma un valor
+                   uniforme (entero si min y max son enteros)
+
+    @return: Una lista de configuraciones (diccionarios)
+
+    """
+    generador = random.Random(semilla)
+
+    def valor(rango):
+        if isinstance(rango, tuple):
+            a, b = rango
+            if isinstance(a, int) and isinstance(b, int):
+                return generador.randint(a, b)
+            return generador.uniform(a, b)
+        return generador.choice(rango)
+
+    return [{nombre: valor(rango) for nombre, rango in rangos.items()}
+            for _ in range(n)]
+
+
+def barrido(problema, configuraciones, presupuesto=1000, eta=3,
+            repeticiones=3, procesos=None, semilla=0, salida=None):
+    """
+    Prueba las configuraciones del temple simulado por reducción sucesiva
+    a la mitad.
+
+    Todas las configuraciones usan las mismas semillas, para que las
+    diferencias se deban a la configuración y no al azar. Una
+    configuración es mejor que otra si tiene menor costo promedio, y a
+    igual costo, menor tiempo promedio.
+
+    @param problema: Un objeto de la clase `Problema` (debe poder copiarse
+                     a otros procesos con pickle). Si tiene un atributo
+                     dmax, cada ejecución usa el de su configuración, o
+                     el original si la configuración no tiene 'dmax'.
+    @param configuraciones: Lista de diccionarios con 'calendario' (una
+                            llave de CALENDARIOS), y opcionalmente 'T_ini',
+                            'tol', 'dmax' y los parámetros de la
+                            calendarización (como 'alfa' o 'beta').
+    @param presupuesto: Evaluaciones de costo por ejecución en la primera
+                        ronda (el temple también termina si la
+                        temperatura baja de tol).
+    @param eta: En cada ronda pasa 1/eta de las configuraciones, y el
+                presupuesto se multiplica por eta.
+    @param repeticiones: Ejecuciones (semillas) por configuración y ronda.
+    @param procesos: Número de procesos (por default, el número de CPUs).
+    @param semilla: Semilla de la primera ejecución de cada configuración.
+    @param salida: Archivo .jsonl o .csv donde se escribe cada ejecución
+                   (opcional).
+
+    @return: Una lista de tuplas (costo, tiempo, configuracion) de la
+             última ronda, de la mejor a la peor.
+
+    """
+    # La calibración se hace sobre una copia y sin alterar el generador
+    # del módulo random de quien llama
+    anterior = random.getstate()
+    copia = copy.deepcopy(problema)
+    blocales.siembra(copia, semilla)
+    T_calibrada = blocales.calibra_temperatura(copia)
+    random.setstate(anterior)
+
+    escritor = _Escritor(salida, configuraciones)
+    vivas = list(range(len(configuraciones)))
+    try:
+        with ProcessPoolExecutor(max_workers=procesos,
+                                 initializer=_inicia_trabajador,
+                                 initargs=(problema,)) as ejecutor:
+            for ronda in itertools.count():
+                futuros = [
+                    ejecutor.submit(_corre, k, configuraciones[k],
+                                    T_calibrada, presupuesto, semilla + r)
+                    for k in vivas for r in range(repeticiones)
+                ]
+                costos = {k: [] for k in vivas}
+                tiempos = {k: [] for k in vivas}
+                for futuro in as_completed(futuros):
+                    registro = futuro.result()
+                    k = registro['configuracion']
+                    costos[k].append(registro['costo'])
+                    tiempos[k].append(registro['tiempo'])
+                    escritor.escribe(dict(registro, ronda=ronda,
+                                          **configuraciones[k]))
+
+                resultados = sorted(
+                    (sum(costos[k]) / repeticiones,
+                     sum(tiempos[k]) / repeticiones, k) for k in vivas)
+                if len(vivas) == 1:
+                    break
+                vivas = [k for (_, _, k) in
+                         resultados[:max(1, len(vivas) // eta)]]
+                presupuesto *= eta
+    finally:
+        escritor.cierra()
+    return [(costo, tiempo, configuraciones[k])
+            for (costo, tiempo, k) in resultados]
+
+
+_problema_trabajador = None
+_dmax_original = None
+
+
+def _inicia_trabajador(problema):
+    """
+    Guarda el problema (y su dmax original) en el proceso, para no
+    copiarlo en cada tarea
+
+    """
+    global _problema_trabajador, _dmax_original
+    _problema_trabajador = problema
+    _dmax_original = getattr(problema, 'dmax', None)
+
+
+def _corre(k, configuracion, T_calibrada, presupuesto, semilla):
+    """
+    Una ejecución del temple simulado con la configuración k
+
+    @return: Un diccionario con la configuración, la semilla, el
+             presupuesto, el costo, el tiempo y las iteraciones
+
+    """
+    problema = _problema_trabajador
+    if hasattr(problema, 'dmax'):
+        problema.dmax = configuracion.get('dmax', _dmax_original)
+    T_ini = configuracion.get('T_ini')
+    T_ini = T_calibrada if T_ini is None else T_ini
+    parametros = {llave: valor for llave, valor in configuracion.items()
+                  if llave not in LLAVES}
+    if configuracion['calendario'] == 'adaptativo':
+        parametros.setdefault('maxit', presupuesto)
+    calendarizador = CALENDARIOS[configuracion['calendario']](T_ini,
+                                                              **parametros)
+
+    blocales.siembra(problema, semilla)
+    inicio = time.perf_counter()
+    for avance in blocales.itera_temple_simulado(
+            problema, calendarizador, configuracion.get('tol', 0.001),
+            parada=blocales.ParadaEvaluaciones(presupuesto), cada=None):
+        pass
+    return {
+        'configuracion': k,
+        'semilla': semilla,
+        'presupuesto': presupuesto,
+        'costo': avance.mejor_costo,
+        'tiempo': time.perf_counter() - inicio,
+        'iteraciones': avance.iteracion,
+    }
+
+
+class _Escritor:
+    """
+    Escribe cada ejecución de barrido en cuanto termina, en JSONL o CSV
+    según la extensión del archivo (o en ningún lado si no hay archivo)
+
+    """
+    CAMPOS = ['ronda', 'configuracion', 'semilla', 'presupuesto', 'costo',
+              'tiempo', 'iteraciones']
+
+    def __init__(self, salida, configuraciones):
+        self._archivo = self._csv = None
+        if salida is None:
+            return
+        self._archivo = open(salida, 'w', newline='')
+        if salida.endswith('.csv'):
+            llaves = sorted(set().union(*configuraciones))
+            self._csv = csv.DictWriter(self._archivo, self.CAMPOS + llaves)
+            self._csv.writeheader()
+
+    def escribe(self, registro):
+        if self._archivo is None:
+            return
+        if self._csv is not None:
+            self._csv.writerow(registro)
+        else:
+            self._archivo.write(json.dumps(registro) + '\n')
+        self._archivo.flush()
+
+    def cierra(self):
+        if self._archivo is not None:
+            self._archivo.close()
+
+
+def main(argumentos=None):
+    """
+    La función principal
+
+    """
+    parser = argparse.ArgumentParser(
+        description="Barrido de parámetros del temple simulado")
+    parser.add_argument('problema', choices=['grafo', 'nreinas'])
+    parser.add_argument('-n', type=int, default=20,
+                        help='Número de vértices o de reinas')
+    parser.add_argument('-a', '--aristas', type=int, default=40,
+                        help='Número de aristas del grafo aleatorio')
+    parser.add_argument('--muestra', type=int, default=None,
+                        help='Número de configuraciones aleatorias '
+                             '(por default, toda la rejilla)')
+    parser.add_argument('--presupuesto', type=int, default=1000)
+    parser.add_argument('--eta', type=int, default=3)
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--procesos', type=int, default=None)
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('-o', '--salida', default=None,
+                        help='Archivo .jsonl o .csv con cada ejecución')
+    args = parser.parse_args(argumentos)
+
+    if args.problema == 'grafo':
+        # Pillow solo se requiere para el grafo
+        import dibuja_grafo
+        from bench_blocales import grafo_aleatorio
+        problema = dibuja_grafo.problema_grafica_grafo(
+            *grafo_aleatorio(args.n, args.aristas, args.semilla))
+    else:
+        import nreinas
+        problema = nreinas.ProblemaNreinas(args.n)
+
+    if args.muestra is None:
+        configuraciones = rejilla(**REJILLA)
+    else:
+        configuraciones = muestra(
+            args.muestra, args.semilla, calendario=REJILLA['calendario'],
+            T_ini=(0.1, 20.0), tol=(0.0001, 0.01), dmax=(1, 50))
+
+    resultados = barrido(problema, configuraciones, args.presupuesto,
+                         args.eta, args.repeticiones, args.procesos,
+                         args.semilla, args.salida)
+    for costo, tiempo, configuracion in resultados:
+        print("costo {:<12.4g} tiempo {:<10.3f} {}".format(
+            costo, tiempo, json.dumps(configuracion)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+bench_blocales.py
+------------
+
+Pruebas de desempeño de los algoritmos de blocales sobre las n reinas y
+el dibujo de grafos.
+
+Cada caso se ejecuta con semillas fijas, y se reporta el número de
+evaluaciones de costo por segundo, el tiempo para llegar al costo
+objetivo, el costo final y la memoria máxima utilizada. Los resultados se
+guardan en JSON, y dos archivos de resultados se pueden comparar para
+detectar regresiones:
+
+$python bench_blocales.py corre -o nuevo.json
+$python bench_blocales.py compara base.json nuevo.json
+
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import blocales
+import nreinas
+
+
+# Tamaños de las n reinas, tamaños (vértices, aristas) de los grafos y
+# algoritmos con sus opciones
+CASOS_NREINAS = [8, 50, 200, 1000]
+CASOS_GRAFOS = [(8, 11), (20, 40), (50, 120)]
+ALGORITMOS = {
+    'descenso_colinas': (blocales.itera_descenso_colinas, {}),
+    'temple_simulado': (blocales.itera_temple_simulado, {}),
+}
+
+# Máximo de evaluaciones de costo por ejecución de las n reinas y de los
+# grafos, para que cada caso tome a lo más unos segundos
+PRESUPUESTO_NREINAS = 200000
+PRESUPUESTO_GRAFOS = 5000
+
+# Máximo de evaluaciones de la ejecución que mide la memoria, que con
+# tracemalloc es unas diez veces más lenta (la memoria máxima se alcanza al
+# construir las estructuras de la búsqueda, al principio)
+PRESUPUESTO_MEMORIA = 1000
+
+
+def grafo_aleatorio(n_vertices, n_aristas, semilla=0):
+    """
+    Genera un grafo aleatorio simple
+
+    @param n_vertices: Número de vértices
+    @param n_aristas: Número de aristas
+    @param semilla: Semilla del generador
+
+    @return: Una tupla (vertices, aristas) como las que recibe
+             problema_grafica_grafo
+
+    """
+    generador = random.Random(semilla)
+    vertices = ['v{}'.format(i) for i in range(n_vertices)]
+    aristas = set()
+    while len(aristas) < n_aristas:
+        v1, v2 = generador.sample(vertices, 2)
+        if (v2, v1) not in aristas:
+            aristas.add((v1, v2))
+    return vertices, sorted(aristas)
+
+
+def casos():
+    """
+    Generador de los casos de prueba
+
+    @return: Tuplas (nombre, problema, algoritmo, opciones, objetivo).
+             El objetivo es None si no se conoce el costo óptimo.
+
+    """
+    for n in CASOS_NREINAS:
+        for nombre, (algoritmo, opciones) in ALGORITMOS.items():
+            opciones = dict(opciones, parada=blocales.ParadaEvaluaciones(
+                PRESUPUESTO_NREINAS))
+            if algoritmo is blocales.itera_descenso_colinas and n >= 200:
+                # Con n grande, cada paso de 'maxima' evalúa n^2 vecinos
+                opciones = dict(opciones, estrategia='primera')
+            yield ('nreinas-{}/{}'.format(n, nombre),
+                   nreinas.ProblemaNreinas(n), algoritmo, opciones, 0)
+
+    # Pillow solo se requiere para los casos de grafos
+    import dibuja_grafo
+    for n_vertices, n_aristas in CASOS_GRAFOS:
+        vertices, aristas = grafo_aleatorio(n_vertices, n_aristas)
+        for nombre, (algoritmo, opciones) in ALGORITMOS.items():
+            opciones = dict(opciones, parada=blocales.ParadaEvaluaciones(
+                PRESUPUESTO_GRAFOS))
+            if algoritmo is blocales.itera_temple_simulado:
+                opciones = dict(opciones, tol=0.1)
+            yield ('grafo-{}-{}/{}'.format(n_vertices, n_aristas, nombre),
+                   dibuja_grafo.problema_grafica_grafo(vertices, aristas),
+                   algoritmo, opciones, None)
+
+
+def mide(problema, algoritmo, opciones, objetivo, semilla=0, intentos=5,
+         memoria=True):
+    """
+    Mide el desempeño de un algoritmo sobre un problema.
+
+    El algoritmo es una búsqueda como generador de avances
+    (itera_descenso_colinas o itera_temple_simulado), y las evaluaciones
+    son las que cuenta la propia búsqueda en su último avance, sin importar
+    si se hacen con costo, delta_costo o costo_lote.
+
+    Se ejecuta el algoritmo con las semillas semilla, semilla + 1, ...
+    hasta llegar al costo objetivo o hasta `intentos` ejecuciones (solo
+    una si el objetivo es None). El tiempo al objetivo es el tiempo
+    acumulado de esas ejecuciones. La
+    primera ejecución se repite con tracemalloc para medir la memoria, de
+    forma que el rastreo no afecte los tiempos, pero solo por
+    PRESUPUESTO_MEMORIA evaluaciones.
+
+    @return: Un diccionario con 'evaluaciones', 'tiempo',
+             'evaluaciones_por_segundo', 'costo_final', 'tiempo_objetivo'
+             (None si no se llegó al objetivo), 'intentos' y 'memoria_pico'
+             en bytes (None si memoria es falso).
+
+    """
+    tiempo_total, tiempo_objetivo = 0.0, None
+    for intento in range(intentos):
+        random.seed(semilla + intento)
+        inicio = time.perf_counter()
+        for avance in algoritmo(problema, cada=None, **opciones):
+            pass
+        tiempo_total += time.perf_counter() - inicio
+        costo = problema.costo(avance.mejor_estado)
+        if intento == 0:
+            evaluaciones, tiempo = avance.evaluaciones, tiempo_total
+            costo_final = costo
+        if objetivo is None:
+            break
+        if costo <= objetivo:
+            tiempo_objetivo = tiempo_total
+            break
+
+    memoria_pico = None
+    if memoria:
+        random.seed(semilla)
+        parada = blocales.ParadaEvaluaciones(PRESUPUESTO_MEMORIA)
+        tracemalloc.start()
+        for _ in algoritmo(problema, cada=None,
+                           **dict(opciones, parada=parada)):
+            pass
+        memoria_pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        'evaluaciones': evaluaciones,
+        'tiempo': tiempo,
+        'evaluaciones_por_segundo': evaluaciones / tiempo if tiempo else None,
+        'costo_final': costo_final,
+        'tiempo_objetivo': tiempo_objetivo,
+        'intentos': intento + 1,
+        'memoria_pico': memoria_pico,
+    }
+
+
+def corre(filtro='', memoria=True, salida=sys.stdout):
+    """
+    Ejecuta todos los casos cuyo nombre contenga `filtro`
+
+    @return: Un diccionario con la información del sistema y una lista
+             de resultados
+
+    """
+    resultados = []
+    for nombre, problema, algoritmo, opciones, objetivo in casos():
+        if filtro not in nombre:
+            continue
+        resultado = dict(caso=nombre, **mide(problema, algoritmo, opciones,
+                                             objetivo, memoria=memoria))
+        resultados.append(resultado)
+        print("{:<40}{:>14.0f} ev/s{:>10.3f} s   costo {}".format(
+            nombre, resultado['evaluaciones_por_segundo'] or 0,
+            resultado['tiempo'], resultado['costo_final']), file=salida)
+    return {
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'resultados': resultados,
+    }
+
+
+def compara(base, nuevo, tolerancia=0.1):
+    """
+    Compara dos resultados de corre y encuentra las regresiones: casos
+    con menos evaluaciones por segundo, más tiempo al objetivo o más
+    memoria (más allá de la tolerancia relativa), o con peor costo final.
+
+    @param base: Resultados de referencia
+    @param nuevo: Resultados a comparar
+    @param tolerancia: Cambio relativo tolerado
+
+    @return: Una lista de tuplas (caso, medida, valor base, valor nuevo)
+
+    """
+    peor = [
+        ('evaluaciones_por_segundo', lambda x, y: y < x * (1 - tolerancia)),
+        ('tiempo_objetivo', lambda x, y: y > x * (1 + tolerancia)),
+        ('memoria_pico', lambda x, y: y > x * (1 + tolerancia)),
+        ('costo_final', lambda x, y: y > x),
+    ]
+    anteriores = {r['caso']: r for r in base['resultados']}
+    regresiones = []
+    for r in nuevo['resultados']:
+        b = anteriores.get(r['caso'])
+        if b is None:
+            continue
+        for medida, empeora in peor:
+            x, y = b.get(medida), r.get(medida)
+            if x is not None and y is None and medida == 'tiempo_objetivo':
+                regresiones.append((r['caso'], medida, x, y))
+            elif x is not None and y is not None and empeora(x, y):
+                regresiones.append((r['caso'], medida, x, y))
+    return regresiones
+
+
+def main(argumentos=None):
+    """
+    La función principal
+
+    """
+    parser = argparse.ArgumentParser(
+        description="Pruebas de desempeño de blocales")
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    p_corre = comandos.add_parser('corre', help='Ejecuta los casos')
+    p_corre.add_argument('-o', '--salida', default='bench_blocales.json')
+    p_corre.add_argument('-f', '--filtro', default='',
+                         help='Solo los casos cuyo nombre contenga el filtro')
+    p_corre.add_argument('--sin-memoria', action='store_true',
+                         help='No mide la memoria (más rápido)')
+
+    p_compara = comandos.add_parser('compara', help='Compara dos resultados')
+    p_compara.add_argument('base')
+    p_compara.add_argument('nuevo')
+    p_compara.add_argument('-t', '--tolerancia', type=float, default=0.1)
+
+    args = parser.parse_args(argumentos)
+    if args.comando == 'corre':
+        resultados = corre(args.filtro, not args.sin_memoria)
+        with open(args.salida, 'w') as archivo:
+            json.dump(resultados, archivo, indent=2)
+        return 0
+
+    with open(args.base) as archivo:
+        base = json.load(archivo)
+    with open(args.nuevo) as archivo:
+        nuevo = json.load(archivo)
+    regresiones = compara(base, nuevo, args.tolerancia)
+    for caso, medida, x, y in regresiones:
+        print("REGRESIÓN {:<40}{:<26}{} -> {}".format(caso, medida, x, y))
+    if not regresiones:
+        print("Sin regresiones")
+    return 1 if regresiones else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,10 +6,22 @@ Algoritmos generales para búsquedas locales
 
 """
 
+import multiprocessing
+import os
+import pickle
 from abc import ABC, abstractmethod
-from itertools import takewhile
-from math import exp
-from random import random
+from collections import OrderedDict, namedtuple
+from copy import copy
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import islice, takewhile
+from math import exp, floor, inf, log, log10
+from random import random, sample, seed, getstate, setstate, Random
+from time import perf_counter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 class Problema(ABC):
@@ -23,6 +35,40 @@ class Problema(ABC):
 
     c) temple_simulado requiere vecino_aleatorio
 
+    d) De manera opcional, un problema puede describir a sus vecinos como
+       movimientos sobre el estado actual, implementando los métodos
+       movimientos, movimiento_aleatorio, delta_costo y aplica_movimiento.
+       Si el problema los implementa, descenso_colinas y temple_simulado
+       evalúan cada candidato por su cambio en costo, y solo generan el
+       nuevo estado cuando el movimiento es aceptado.
+
+    e) Además, un problema con el protocolo de movimientos puede trabajar
+       sobre un estado mutable (por ejemplo un array('i')), implementando
+       estado_mutable y deshaz_movimiento. En ese caso aplica_movimiento
+       modifica el estado en su lugar, y las búsquedas no generan ningún
+       estado nuevo por iteración: solo convierten a tupla el estado que
+       regresan. Si el problema sabe aplicar y deshacer movimientos pero no
+       implementa delta_costo, las búsquedas evalúan cada movimiento
+       aplicándolo, calculando el costo y deshaciéndolo.
+
+    f) Las búsquedas por población (algoritmo_genetico y temple_multiple)
+       evalúan muchos estados a la vez con costo_lote, que por default
+       llama a costo con cada estado, pero que el problema puede
+       sobreescribir con una versión vectorizada. algoritmo_genetico
+       requiere además el método cruza.
+
+    g) busqueda_tabu identifica a los estados por un hash de Zobrist. Si
+       el problema implementa el protocolo de movimientos y el método
+       cambios, el hash de cada vecino se obtiene en O(1) a partir de los
+       valores que cambia el movimiento; si no, comparando el vecino con
+       el estado actual.
+
+    h) Un problema puede guardar en el atributo `aleatorio` un objeto
+       `Aleatorio`, y tomar de él los números de vecino_aleatorio y
+       movimiento_aleatorio. En ese caso, las búsquedas de temple también
+       lo usan en el criterio de aceptación, y las búsquedas en paralelo
+       le dan una semilla distinta en cada proceso.
+
     """
     @abstractmethod
     def estado_aleatorio(self):
@@ -69,58 +115,1828 @@ class Problema(ABC):
         """
         raise NotImplementedError("Este metodo debe ser implementado")
 
+    def movimientos(self, estado):
+        """
+        Generador de los movimientos posibles a partir de un estado
+        (opcional). Cada movimiento describe un vecino de `estado`.
+
+        @param estado: Una tupla que describe un estado
+
+        @return: Un generador de movimientos
+
+        """
+        raise NotImplementedError("Metodo opcional no implementado")
+
+    def movimiento_aleatorio(self, estado):
+        """
+        Genera un movimiento aleatorio a partir de un estado (opcional),
+        con la misma distribución que vecino_aleatorio.
+
+        @param estado: Una tupla que describe un estado
+
+        @return: Un movimiento
+
+        """
+        raise NotImplementedError("Metodo opcional no implementado")
+
+    def delta_costo(self, estado, movimiento):
+        """
+        Calcula el cambio en el costo al aplicar un movimiento (opcional),
+        sin generar el estado vecino.
+
+        @param estado: Una tupla que describe un estado
+        @param movimiento: Un movimiento generado a partir de `estado`
+
+        @return: costo(vecino) - costo(estado)
+
+        """
+        raise NotImplementedError("Metodo opcional no implementado")
+
+    def aplica_movimiento(self, estado, movimiento):
+        """
+        Aplica un movimiento a un estado (opcional).
+
+        @param estado: Una tupla que describe un estado
+        @param movimiento: Un movimiento generado a partir de `estado`
+
+        @return: Una tupla con el estado vecino. Si `estado` es mutable
+                 (ver estado_mutable), lo modifica y lo regresa.
+
+        """
+        raise NotImplementedError("Metodo opcional no implementado")
+
+    def estado_mutable(self, estado):
+        """
+        Genera una copia mutable de un estado (opcional), sobre la que
+        aplica_movimiento y deshaz_movimiento trabajan en su lugar.
+
+        @param estado: Una tupla que describe un estado
+
+        @return: El mismo estado en una estructura mutable (cuyo tuple()
+                 es el estado como tupla)
+
+        """
+        raise NotImplementedError("Metodo opcional no implementado")
+
+    def deshaz_movimiento(self, estado, movimiento):
+        """
+        Deshace en su lugar un movimiento aplicado a un estado mutable
+        (opcional).
+
+        @param estado: Un estado mutable al que se aplicó `movimiento`
+        @param movimiento: El último movimiento aplicado a `estado`
+
+        @return: El mismo estado, como estaba antes del movimiento
+
+        """
+        raise NotImplementedError("Metodo opcional no implementado")
+
+    def cambios(self, estado, movimiento):
+        """
+        Describe los valores del estado que modifica un movimiento
+        (opcional).
+
+        @param estado: Una tupla que describe un estado
+        @param movimiento: Un movimiento generado a partir de `estado`
+
+        @return: Una secuencia de tuplas (posicion, anterior, nuevo)
+
+        """
+        raise NotImplementedError("Metodo opcional no implementado")
+
+    def costo_lote(self, estados):
+        """
+        Calcula el costo de varios estados a la vez. Por default se evalúa
+        cada estado con costo.
+
+        @param estados: Una secuencia de estados (por ejemplo, un arreglo
+                        de NumPy de dos dimensiones, un estado por renglón)
+
+        @return: Una lista con el costo de cada estado
+
+        """
+        return [self.costo(estado) for estado in estados]
+
+    def cruza(self, estado1, estado2):
+        """
+        Genera un estado hijo a partir de dos estados padre (opcional).
+
+        @param estado1: Una tupla que describe un estado
+        @param estado2: Una tupla que describe un estado
+
+        @return: Una tupla con el estado hijo
+
+        """
+        raise NotImplementedError("Metodo opcional no implementado")
+
+
+class Estadisticas:
+    """
+    Estadísticas de una ejecución de descenso_colinas o temple_simulado.
+
+    Se pasa como argumento `estadisticas` a la búsqueda, la cual la llena.
+    Si no se pasa, la búsqueda no hace ningún trabajo extra. Al terminar,
+    además de las estadísticas contiene el estado encontrado y su costo.
+
+    Atributos:
+
+    iteraciones: Número de iteraciones de la búsqueda.
+    llamadas: Diccionario con el número de llamadas a cada método del
+              problema dentro de la búsqueda ('costo', 'delta_costo',
+              'vecinos', 'vecino_aleatorio', ...).
+    tiempos: Diccionario con el tiempo en segundos dentro de cada método.
+    propuestas, aceptadas: Diccionarios con el número de vecinos
+              propuestos y aceptados por banda de temperatura. La banda b
+              agrupa las temperaturas en [10^b, 10^(b+1)) (None en
+              descenso_colinas).
+    trayectoria: Lista de tuplas (iteracion, segundos, mejor_costo) cada
+              vez que mejora el mejor costo.
+    tiempo: Duración total en segundos.
+    estado, costo: El estado final y su costo.
+
+    """
+    def __init__(self):
+        self.iteraciones = 0
+        self.llamadas = {}
+        self.tiempos = {}
+        self.propuestas = {}
+        self.aceptadas = {}
+        self.trayectoria = []
+        self.mejor_costo = inf
+        self.tiempo = 0.0
+        self.estado = self.costo = None
+        self._inicio = None
+
+    def inicia(self):
+        """
+        Marca el inicio de la búsqueda
+
+        """
+        self._inicio = perf_counter()
+
+    def registra(self, T, aceptado, costo):
+        """
+        Registra una iteración de la búsqueda
+
+        @param T: La temperatura (None si no aplica)
+        @param aceptado: Si el vecino propuesto fue aceptado
+        @param costo: El costo del estado actual
+
+        """
+        self.iteraciones += 1
+        banda = None if T is None else floor(log10(T))
+        self.propuestas[banda] = self.propuestas.get(banda, 0) + 1
+        if aceptado:
+            self.aceptadas[banda] = self.aceptadas.get(banda, 0) + 1
+        if costo < self.mejor_costo:
+            self.mejor_costo = costo
+            self.trayectoria.append(
+                (self.iteraciones, perf_counter() - self._inicio, costo))
+
+    def termina(self, estado, costo):
+        """
+        Registra el resultado de la búsqueda
+
+        """
+        self.tiempo = perf_counter() - self._inicio
+        self.estado, self.costo = estado, costo
+
+    def tasa_aceptacion(self):
+        """
+        @return: Un diccionario con la fracción de vecinos aceptados por
+                 banda de temperatura
+
+        """
+        return {banda: self.aceptadas.get(banda, 0) / propuestas
+                for banda, propuestas in self.propuestas.items()}
+
+    def cronometra(self, nombre, metodo):
+        """
+        Envuelve un método para contar sus llamadas y medir su tiempo. Los
+        generadores ('vecinos', 'movimientos') se miden en cada elemento.
+
+        """
+        self.llamadas.setdefault(nombre, 0)
+        self.tiempos.setdefault(nombre, 0.0)
+
+        def cronometrado(*args):
+            inicio = perf_counter()
+            try:
+                return metodo(*args)
+            finally:
+                self.llamadas[nombre] += 1
+                self.tiempos[nombre] += perf_counter() - inicio
+
+        def generador_cronometrado(*args):
+            self.llamadas[nombre] += 1
+            inicio = perf_counter()
+            generador = iter(metodo(*args))
+            self.tiempos[nombre] += perf_counter() - inicio
+            while True:
+                inicio = perf_counter()
+                try:
+                    elemento = next(generador)
+                except StopIteration:
+                    return
+                finally:
+                    self.tiempos[nombre] += perf_counter() - inicio
+                yield elemento
+
+        if nombre in ('vecinos', 'movimientos'):
+            return generador_cronometrado
+        return cronometrado
+
+
+class Aleatorio:
+    """
+    Fuente de números aleatorios con semilla propia para los ciclos de
+    las búsquedas.
+
+    Los enteros de cada rango se generan por bloques (con NumPy, si está
+    instalado) y se entregan uno a uno, varias veces más rápido que con
+    random.randint o random.sample. Los uniformes se toman de un
+    random.Random propio, que es más rápido que entregarlos de un bloque.
+
+        aleatorio = Aleatorio(semilla)
+        indice = aleatorio.enteros(0, n - 1)
+        i, u = indice(), aleatorio.uniforme()
+
+    Los objetos de flujos() son independientes entre sí, para procesos en
+    paralelo. Los respaldos de descenso_colinas y temple_simulado guardan
+    el estado del Aleatorio del problema (ver estado y restablece), por lo
+    que la búsqueda continúa igual que si no se hubiera interrumpido.
+
+    """
+    def __init__(self, semilla=None, bloque=4096):
+        """
+        @param semilla: Semilla (un entero, o un np.random.SeedSequence)
+        @param bloque: Número de enteros que se generan a la vez
+
+        """
+        self.bloque = bloque
+        self.reinicia(semilla)
+
+    def reinicia(self, semilla=None):
+        """
+        Vuelve a empezar todos los flujos a partir de una semilla
+
+        """
+        if np is not None:
+            if not isinstance(semilla, np.random.SeedSequence):
+                semilla = np.random.SeedSequence(semilla)
+            self._numpy = np.random.default_rng(semilla)
+            self._random = Random(int(self._numpy.integers(2**63)))
+        else:
+            self._numpy = None
+            self._random = Random(semilla)
+        self._semilla = semilla
+        self._enteros = {}
+        self._actuales = {}
+        self.uniforme = self._random.random
+
+    def enteros(self, a, b):
+        """
+        @return: Una función sin argumentos que regresa enteros uniformes
+                 en [a, b]
+
+        """
+        flujo = self._enteros.get((a, b))
+        if flujo is None:
+            flujo = self._enteros[a, b] = self._bloques(a, b).__next__
+        return flujo
+
+    def _bloques(self, a, b, actual=()):
+        # El iterador del bloque actual se guarda para saber qué enteros
+        # faltan por entregar (ver estado)
+        uniforme, k = self._random.random, b - a + 1
+        actual = iter(actual)
+        while True:
+            self._actuales[a, b] = actual
+            yield from actual
+            if self._numpy is not None:
+                actual = iter(self._numpy.integers(a, b + 1,
+                                                   self.bloque).tolist())
+            else:
+                actual = iter([a + int(uniforme() * k)
+                               for _ in range(self.bloque)])
+
+    def estado(self):
+        """
+        @return: El estado de todos los flujos (se puede guardar con
+                 pickle), para volver a él con restablece
+
+        """
+        return {
+            'semilla': self._semilla,
+            'numpy': (None if self._numpy is None else
+                      self._numpy.bit_generator.state),
+            'random': self._random.getstate(),
+            'enteros': {rango: list(copy(actual))
+                        for rango, actual in self._actuales.items()},
+        }
+
+    def restablece(self, estado):
+        """
+        Regresa todos los flujos a un estado obtenido con estado(). Las
+        funciones de enteros obtenidas antes dejan de usarse, y se deben
+        volver a pedir con enteros.
+
+        """
+        self._semilla = estado['semilla']
+        if self._numpy is not None:
+            self._numpy.bit_generator.state = estado['numpy']
+        self._random.setstate(estado['random'])
+        self._actuales = {}
+        self._enteros = {
+            (a, b): self._bloques(a, b, pendientes).__next__
+            for (a, b), pendientes in estado['enteros'].items()
+        }
+
+    def flujos(self, n):
+        """
+        @return: Una lista con n objetos Aleatorio independientes
+
+        """
+        if self._numpy is not None:
+            semillas = self._semilla.spawn(n)
+        else:
+            semillas = [self._random.getrandbits(64) for _ in range(n)]
+        return [Aleatorio(semilla, self.bloque) for semilla in semillas]
+
+    def __getstate__(self):
+        # Los flujos de enteros son generadores, y se vuelven a crear
+        estado = self.__dict__.copy()
+        estado['_enteros'] = {}
+        estado['_actuales'] = {}
+        return estado
+
+
+def siembra(problema, semilla):
+    """
+    Fija la semilla del módulo random y, si el problema tiene uno, la de
+    su Aleatorio, de forma que una búsqueda sobre el problema se pueda
+    repetir (por ejemplo, en otro proceso)
+
+    """
+    seed(semilla)
+    aleatorio = getattr(problema, 'aleatorio', None)
+    if isinstance(aleatorio, Aleatorio):
+        aleatorio.reinicia(semilla)
+
+
+def _estado_aleatorio(problema):
+    """
+    El estado del Aleatorio del problema para un respaldo, o None
+
+    """
+    aleatorio = getattr(problema, 'aleatorio', None)
+    if isinstance(aleatorio, Aleatorio):
+        return aleatorio.estado()
+    return None
+
+
+def _restablece_aleatorio(problema, estado):
+    """
+    Regresa el Aleatorio del problema al estado guardado en un respaldo
+
+    """
+    aleatorio = getattr(problema, 'aleatorio', None)
+    if isinstance(aleatorio, Aleatorio) != (estado is not None):
+        raise ValueError("El respaldo y el problema no coinciden en el uso "
+                         "de un Aleatorio")
+    if estado is not None:
+        aleatorio.restablece(estado)
+
+
+def _uniforme(problema):
+    """
+    La función de uniformes del Aleatorio del problema, o random
+
+    """
+    aleatorio = getattr(problema, 'aleatorio', None)
+    return random if aleatorio is None else aleatorio.uniforme
+
+
+class CacheCosto(Problema):
+    """
+    Problema que delega en otro, guardando en una memoria LRU acotada el
+    costo de los últimos estados evaluados, para no volver a calcularlo
+    cuando la búsqueda repite estados (por ejemplo, el temple simulado
+    cerca de converger).
+
+    Solo se delegan los métodos obligatorios y cruza, y no el protocolo de
+    movimientos: así las búsquedas evalúan vecinos completos con costo, que
+    es lo que se guarda. Cualquier otro atributo (como dibuja_grafo o n)
+    se toma del problema original.
+
+    Atributos:
+
+    aciertos, fallos: Número de costos encontrados y no encontrados en la
+                      memoria.
+    desalojos: Número de costos sacados de la memoria llena.
+
+    """
+    def __init__(self, problema, tamano=100000):
+        """
+        @param problema: Un objeto de la clase `Problema`
+        @param tamano: Máximo número de costos en la memoria
+
+        """
+        self.problema = problema
+        self.tamano = tamano
+        self.aciertos = self.fallos = self.desalojos = 0
+        self._costos = OrderedDict()
+
+    def __getattr__(self, nombre):
+        if nombre == 'problema' or nombre.startswith('__'):
+            raise AttributeError(nombre)
+        return getattr(self.problema, nombre)
+
+    def estado_aleatorio(self):
+        return self.problema.estado_aleatorio()
+
+    def vecinos(self, estado):
+        return self.problema.vecinos(estado)
+
+    def vecino_aleatorio(self, estado):
+        return self.problema.vecino_aleatorio(estado)
+
+    def cruza(self, estado1, estado2):
+        return self.problema.cruza(estado1, estado2)
+
+    def costo(self, estado):
+        """
+        El costo del problema original, tomado de la memoria si está
+
+        """
+        costos = self._costos
+        costo = costos.get(estado)
+        if costo is not None:
+            costos.move_to_end(estado)
+            self.aciertos += 1
+            return costo
+        self.fallos += 1
+        costo = costos[estado] = self.problema.costo(estado)
+        if len(costos) > self.tamano:
+            costos.popitem(last=False)
+            self.desalojos += 1
+        return costo
+
+    def tasa_aciertos(self):
+        """
+        @return: La fracción de llamadas a costo que se encontraron en la
+                 memoria (None si no hay llamadas)
+
+        """
+        llamadas = self.aciertos + self.fallos
+        return self.aciertos / llamadas if llamadas else None
+
+
+def _metodos(problema, estadisticas, *nombres):
+    """
+    Obtiene los métodos del problema que usa el ciclo de una búsqueda,
+    cronometrados si se piden estadísticas
+
+    """
+    metodos = [getattr(problema, nombre) for nombre in nombres]
+    if estadisticas is None:
+        return metodos
+    return [estadisticas.cronometra(nombre, metodo)
+            for nombre, metodo in zip(nombres, metodos)]
+
+
+def _implementa(problema, *metodos):
+    """
+    Revisa si el problema sobreescribe los métodos opcionales de Problema
+
+    """
+    return all(
+        getattr(type(problema), metodo, None) is not getattr(Problema, metodo)
+        for metodo in metodos
+    )
+
+
+_VECINOS = {'movimientos': 'vecinos',
+            'movimiento_aleatorio': 'vecino_aleatorio'}
+
+
+def _usa_movimientos(problema, generador):
+    """
+    Revisa si _protocolo usa los movimientos del problema (casos a y b) o
+    sus vecinos (caso c)
+
+    """
+    return (_implementa(problema, generador, 'delta_costo',
+                        'aplica_movimiento') or
+            _implementa(problema, generador, 'estado_mutable',
+                        'aplica_movimiento', 'deshaz_movimiento'))
+
+
+def _protocolo(problema, estadisticas, generador, estado, costo):
+    """
+    Obtiene las funciones con las que el ciclo de una búsqueda genera,
+    evalúa y aplica movimientos, cronometradas si se piden estadísticas:
+
+    a) Si el problema implementa el protocolo de movimientos, sus métodos,
+       sobre un estado mutable si implementa estado_mutable.
+    b) Si el problema tiene estado mutable y sabe aplicar y deshacer
+       movimientos, pero no implementa delta_costo, el cambio en el costo
+       se obtiene aplicando el movimiento, evaluando y deshaciéndolo.
+    c) Si no, los vecinos hacen de movimientos y el cambio en el costo se
+       obtiene con costo.
+
+    @param generador: 'movimientos' o 'movimiento_aleatorio'
+    @param estado: El estado inicial de la búsqueda
+    @param costo: El costo del estado inicial
+
+    @return: Una tupla (estado, generador, delta_costo, aplica), donde
+             aplica(estado, movimiento, delta) regresa el nuevo estado
+
+    """
+    mutable = _implementa(problema, 'estado_mutable')
+    if _implementa(problema, generador, 'delta_costo', 'aplica_movimiento'):
+        generar, delta_costo, aplica_movimiento = _metodos(
+            problema, estadisticas,
+            generador, 'delta_costo', 'aplica_movimiento')
+        if mutable:
+            estado = problema.estado_mutable(estado)
+        return (estado, generar, delta_costo,
+                lambda estado, movimiento, delta:
+                aplica_movimiento(estado, movimiento))
+
+    # En b) y c) se lleva el costo del estado actual
+    actual = [costo]
+    if mutable and _implementa(problema, generador, 'aplica_movimiento',
+                               'deshaz_movimiento'):
+        generar, costo_de, aplica_movimiento, deshaz_movimiento = _metodos(
+            problema, estadisticas, generador, 'costo',
+            'aplica_movimiento', 'deshaz_movimiento')
+        estado = problema.estado_mutable(estado)
+
+        def delta_costo(estado, movimiento):
+            costo_vecino = costo_de(aplica_movimiento(estado, movimiento))
+            deshaz_movimiento(estado, movimiento)
+            return costo_vecino - actual[0]
+
+        def aplica(estado, movimiento, delta):
+            actual[0] += delta
+            return aplica_movimiento(estado, movimiento)
+    else:
+        generar, costo_de = _metodos(problema, estadisticas,
+                                     _VECINOS[generador], 'costo')
+
+        def delta_costo(estado, vecino):
+            return costo_de(vecino) - actual[0]
+
+        def aplica(estado, vecino, delta):
+            actual[0] += delta
+            return vecino
+    return estado, generar, delta_costo, aplica
 
-def descenso_colinas(problema, maxit=1e6):
+
+class Avance(namedtuple('Avance', ['iteracion', 'temperatura', 'costo',
+                                   'mejor_costo', 'mejor_estado',
+                                   'evaluaciones'])):
+    """
+    Avance de una búsqueda, que generan itera_descenso_colinas e
+    itera_temple_simulado: el número de iteración, la temperatura (None
+    en descenso_colinas), el costo del estado actual, el mejor costo y
+    estado (una tupla) encontrados hasta el momento, y el número de
+    evaluaciones de costo (o de cambio en el costo) realizadas, el mismo
+    que recibe el criterio de paro.
+
+    """
+    __slots__ = ()
+
+
+def descenso_colinas(problema, maxit=1e6, estadisticas=None, parada=None,
+                     estrategia='maxima', k=100, respaldo=None,
+                     cada_respaldo=60, estado_inicial=None):
     """
     Busqueda local por descenso de colinas.
 
     @param problema: Un objeto de una clase heredada de Problema
     @param maxit: Máximo número de iteraciones
+    @param estadisticas: Un objeto `Estadisticas` a llenar (opcional)
+    @param parada: Un criterio de paro `Parada` (opcional), que se revisa
+                   después de cada iteración
+    @param estrategia: Cómo se elige el siguiente estado:
+                       'maxima': el mejor de todos los vecinos.
+                       'primera': el primer vecino que mejora el costo, en
+                                  el orden en que los genera el problema.
+                       'muestra': el mejor de k vecinos aleatorios. La
+                                  búsqueda termina cuando ninguno de los k
+                                  mejora el costo.
+    @param k: Número de vecinos de la estrategia 'muestra'
+    @param respaldo: Ruta de un archivo de respaldo (opcional). Si el
+                     archivo existe, la búsqueda continúa desde él, con el
+                     mismo resultado que si no se hubiera interrumpido. La
+                     búsqueda lo reescribe cada `cada_respaldo` segundos,
+                     y lo borra al terminar. Si el respaldo es de otra
+                     búsqueda o de otro problema (otra clase o longitud
+                     del estado) se lanza ValueError. Las estadísticas y
+                     el criterio de paro empiezan de nuevo al continuar.
+    @param cada_respaldo: Segundos entre respaldos.
+    @param estado_inicial: Estado desde el que empieza la búsqueda (por
+                           default, un estado aleatorio).
 
     @return: El estado con el menor costo encontrado
 
     """
-    estado = problema.estado_aleatorio()
-    costo = problema.costo(estado)
+    for avance in itera_descenso_colinas(problema, maxit, estadisticas,
+                                         parada, estrategia, k, None,
+                                         respaldo, cada_respaldo,
+                                         estado_inicial):
+        pass
+    return avance.mejor_estado
+
+
+def itera_descenso_colinas(problema, maxit=1e6, estadisticas=None,
+                           parada=None, estrategia='maxima', k=100, cada=10,
+                           respaldo=None, cada_respaldo=60,
+                           estado_inicial=None):
+    """
+    Descenso de colinas como generador: la búsqueda avanza solo mientras
+    se le piden avances, por lo que se puede mostrar su progreso o
+    detenerla con solo dejar de iterar, sin usar hilos.
+
+    Los parámetros son los de descenso_colinas, más:
+
+    @param cada: Número de iteraciones entre avances (None para generar
+                 solo el avance final).
+
+    @return: Un generador de objetos `Avance`, cada `cada` iteraciones y
+             al terminar la búsqueda.
+
+    """
+    if estrategia not in ('maxima', 'primera', 'muestra'):
+        raise ValueError("Estrategia desconocida: {}".format(estrategia))
+    primera = estrategia == 'primera'
+    if estrategia == 'muestra':
+        generador = 'movimiento_aleatorio'
+    else:
+        generador = 'movimientos'
+    datos = _lee_respaldo(respaldo, 'descenso_colinas', problema)
 
-    for _ in range(int(maxit)):
-        e = min(problema.vecinos(estado), key=problema.costo)
-        c = problema.costo(e)
-        if c >= costo:
+    if estadisticas is not None:
+        estadisticas.inicia()
+    if parada is not None:
+        parada.inicia()
+    if datos is None:
+        estado = (problema.estado_aleatorio() if estado_inicial is None
+                  else estado_inicial)
+        costo = problema.costo(estado)
+        iteracion, evaluaciones = 0, 1
+    else:
+        estado, costo = datos['estado'], datos['costo']
+        iteracion, evaluaciones = datos['iteracion'], datos['evaluaciones']
+        setstate(datos['aleatorio'])
+        _restablece_aleatorio(problema, datos['aleatorio_problema'])
+    siguiente = inf if cada is None else (iteracion // cada + 1) * cada
+    proximo_respaldo = perf_counter() + cada_respaldo
+
+    estado, movimientos, delta_costo, aplica = _protocolo(
+        problema, estadisticas, generador, estado, costo)
+    if estrategia == 'muestra':
+        movimientos = _muestra(movimientos, k)
+    while iteracion < maxit:
+        delta, movimiento = inf, None
+        for m in movimientos(estado):
+            d = delta_costo(estado, m)
+            evaluaciones += 1
+            if d < delta:
+                delta, movimiento = d, m
+                if primera and d < 0:
+                    break
+        if delta >= 0:
+            break
+        iteracion += 1
+        estado = aplica(estado, movimiento, delta)
+        costo += delta
+        if estadisticas is not None:
+            estadisticas.registra(None, True, costo)
+        if parada is not None and parada.detener(
+                iteracion, evaluaciones, costo, costo):
             break
-        estado, costo = e, c
-    return estado
+        if respaldo is not None and perf_counter() >= proximo_respaldo:
+            _guarda_respaldo(respaldo, {
+                'busqueda': 'descenso_colinas',
+                'huella': _huella(problema, estado), 'iteracion': iteracion,
+                'evaluaciones': evaluaciones, 'estado': tuple(estado),
+                'costo': costo, 'aleatorio': getstate(),
+                'aleatorio_problema': _estado_aleatorio(problema)})
+            proximo_respaldo = perf_counter() + cada_respaldo
+        if iteracion >= siguiente:
+            siguiente += cada
+            yield Avance(iteracion, None, costo, costo, tuple(estado),
+                         evaluaciones)
+
+    _borra_respaldo(respaldo)
+    estado = tuple(estado)
+    if estadisticas is not None:
+        estadisticas.termina(estado, costo)
+    yield Avance(iteracion, None, costo, costo, estado, evaluaciones)
+
+
+def _muestra(aleatorio, k):
+    """
+    Convierte un generador de un vecino (o movimiento) aleatorio en un
+    generador de k de ellos
+
+    """
+    def muestra(estado):
+        for _ in range(k):
+            yield aleatorio(estado)
+    return muestra
 
 
-def temple_simulado(problema, calendarizador=None, tol=0.001):
+def temple_simulado(problema, calendarizador=None, tol=0.001,
+                    estadisticas=None, parada=None, respaldo=None,
+                    cada_respaldo=60, estado_inicial=None):
     """
     Busqueda local por temple simulado
 
     @param problema: Un objeto de la clase `Problema`.
-    @param calendarizador: Un generador de temperatura (simulación).
+    @param calendarizador: Un generador de temperatura (simulación). Si
+                           tiene un método registra, se le informa si
+                           cada vecino fue aceptado (ver
+                           CalendarioAdaptativo). Por default se usa
+                           T_ini / (1 + i), con T_ini el doble de la
+                           diferencia de costos en una muestra de estados
+                           aleatorios. Para llegar a tol en menos
+                           iteraciones, ver calibra_temperatura y
+                           calendario_presupuesto.
     @param tol: Temperatura mínima considerada diferente a cero.
+    @param estadisticas: Un objeto `Estadisticas` a llenar (opcional)
+    @param parada: Un criterio de paro `Parada` (opcional), que se revisa
+                   después de cada iteración. Con el calendarizador por
+                   default, también se revisa durante la calibración de
+                   T_ini, y las evaluaciones de la muestra cuentan como
+                   evaluaciones de la búsqueda.
+    @param respaldo: Ruta de un archivo de respaldo (opcional), como en
+                     descenso_colinas. Al continuar, el calendarizador se
+                     toma del respaldo si se pudo guardar con pickle (como
+                     CalendarioAdaptativo); si no, al que se pasa se le
+                     descartan las temperaturas ya usadas.
+    @param cada_respaldo: Segundos entre respaldos.
+    @param estado_inicial: Estado desde el que empieza la búsqueda (por
+                           default, un estado aleatorio).
 
     @return: El estado con el menor costo encontrado
 
     """
+    for avance in itera_temple_simulado(problema, calendarizador, tol,
+                                        estadisticas, parada, None,
+                                        respaldo, cada_respaldo,
+                                        estado_inicial):
+        pass
+    return avance.mejor_estado
+
+
+def itera_temple_simulado(problema, calendarizador=None, tol=0.001,
+                          estadisticas=None, parada=None, cada=1000,
+                          respaldo=None, cada_respaldo=60,
+                          estado_inicial=None):
+    """
+    Temple simulado como generador: la búsqueda avanza (y toma
+    temperaturas del calendarizador) solo mientras se le piden avances,
+    por lo que se puede mostrar su progreso, dibujar estados intermedios o
+    detenerla con solo dejar de iterar, sin usar hilos. Por ejemplo, para
+    correr varias búsquedas dentro de asyncio sin bloquear el ciclo de
+    eventos:
+
+        for avance in itera_temple_simulado(problema):
+            await asyncio.sleep(0)
+
+    Los parámetros son los de temple_simulado, más:
+
+    @param cada: Número de iteraciones entre avances (None para generar
+                 solo el avance final).
+
+    @return: Un generador de objetos `Avance`, cada `cada` iteraciones y
+             al terminar la búsqueda.
+
+    """
+    datos = _lee_respaldo(respaldo, 'temple_simulado', problema)
+    inicio = 0 if datos is None else datos['iteracion']
+
+    if estadisticas is not None:
+        estadisticas.inicia()
+    if parada is not None:
+        parada.inicia()
+
+    # El calendarizador se guarda en el respaldo solo si se puede copiar
+    guarda_calendarizador = False
+    evaluaciones = 0
     if calendarizador is None:
-        costos = [
-            problema.costo(problema.estado_aleatorio())
-            for _ in range(10 * len(problema.estado_aleatorio()))
-        ]
-        minimo,  maximo = min(costos), max(costos)
-        T_ini = 2 * (maximo - minimo)
-        calendarizador = (T_ini/(1 + i) for i in range(int(1e10)))
+        if datos is None:
+            T_ini, evaluaciones = _temperatura_inicial(
+                problema, estadisticas, parada)
+        else:
+            T_ini = datos['T_ini']
+        calendarizador = (T_ini/(1 + i) for i in range(inicio, int(1e10)))
+    else:
+        T_ini = None
+        guarda_calendarizador = (respaldo is not None and
+                                 _se_puede_guardar(calendarizador))
+        if datos is not None and datos['calendarizador'] is not None:
+            calendarizador = datos['calendarizador']
+        elif datos is not None:
+            next(islice(calendarizador, inicio, inicio), None)
+    registra = getattr(calendarizador, 'registra', None)
+    uniforme = _uniforme(problema)
 
-    estado = problema.estado_aleatorio()
-    costo = problema.costo(estado)
+    if datos is None:
+        estado = (problema.estado_aleatorio() if estado_inicial is None
+                  else estado_inicial)
+        costo = problema.costo(estado)
+        evaluaciones += 1
+        mejor_estado, mejor_costo = None, costo
+    else:
+        estado, costo = datos['estado'], datos['costo']
+        evaluaciones = datos['evaluaciones']
+        mejor_estado, mejor_costo = datos['mejor_estado'], datos['mejor_costo']
+        setstate(datos['aleatorio'])
+        _restablece_aleatorio(problema, datos['aleatorio_problema'])
+    siguiente = inf if cada is None else (inicio // cada + 1) * cada
+    proximo_respaldo = perf_counter() + cada_respaldo
+    estado, movimiento_aleatorio, delta_costo, aplica = _protocolo(
+        problema, estadisticas, 'movimiento_aleatorio', estado, costo)
+
+    # El mejor estado solo se copia al salir de él con un incremento en el
+    # costo; mientras en_mejor sea cierto, el mejor estado es el actual.
+    en_mejor = mejor_estado is None
+    iteracion, T = inicio, None
+    for iteracion, T in enumerate(takewhile(lambda i: i > tol,
+                                            calendarizador), inicio + 1):
 
-    for T in takewhile(lambda i: i > tol, calendarizador):
+        movimiento = movimiento_aleatorio(estado)
+        incremento_costo = delta_costo(estado, movimiento)
+        evaluaciones += 1
 
-        vecino = problema.vecino_aleatorio(estado)
-        costo_vecino = problema.costo(vecino)
-        incremento_costo = costo_vecino - costo
+        aceptado = (incremento_costo <= 0 or
+                    uniforme() < exp(-incremento_costo / T))
+        if aceptado:
+            if en_mejor and incremento_costo > 0:
+                mejor_estado, en_mejor = tuple(estado), False
+            estado = aplica(estado, movimiento, incremento_costo)
+            costo += incremento_costo
+            if costo < mejor_costo:
+                mejor_costo, en_mejor = costo, True
+        if registra is not None:
+            registra(aceptado)
+        if estadisticas is not None:
+            estadisticas.registra(T, aceptado, costo)
+        if parada is not None and parada.detener(
+                iteracion, evaluaciones, costo, mejor_costo):
+            break
+        # El reloj solo se consulta cada 1000 iteraciones
+        if (respaldo is not None and iteracion % 1000 == 0 and
+                perf_counter() >= proximo_respaldo):
+            _guarda_respaldo(respaldo, {
+                'busqueda': 'temple_simulado',
+                'huella': _huella(problema, estado), 'iteracion': iteracion,
+                'evaluaciones': evaluaciones, 'estado': tuple(estado),
+                'costo': costo,
+                'mejor_estado': None if en_mejor else mejor_estado,
+                'mejor_costo': mejor_costo, 'T_ini': T_ini,
+                'calendarizador': (calendarizador if guarda_calendarizador
+                                   else None),
+                'aleatorio': getstate(),
+                'aleatorio_problema': _estado_aleatorio(problema)})
+            proximo_respaldo = perf_counter() + cada_respaldo
+        if iteracion >= siguiente:
+            siguiente += cada
+            yield Avance(iteracion, T, costo, mejor_costo,
+                         tuple(estado) if en_mejor else mejor_estado,
+                         evaluaciones)
+
+    _borra_respaldo(respaldo)
+    if en_mejor:
+        mejor_estado = tuple(estado)
+    if estadisticas is not None:
+        estadisticas.termina(mejor_estado, mejor_costo)
+    yield Avance(iteracion, T, costo, mejor_costo, mejor_estado,
+                 evaluaciones)
+
+
+def busqueda_tabu(problema, maxit=1000, tenencia=100, politica='fifo',
+                  semilla=0, estadisticas=None, parada=None):
+    """
+    Busqueda tabú.
+
+    En cada iteración se pasa al mejor vecino que no sea tabú, aunque
+    empeore el costo. Son tabú los últimos `tenencia` estados visitados,
+    salvo que mejoren el mejor costo encontrado (criterio de aspiración).
+    Los estados se identifican por un hash de Zobrist, que se actualiza
+    con cada movimiento sin recorrer el estado completo (ver el punto g)
+    de Problema). Si el problema usa movimientos pero no implementa
+    cambios, los cambios se obtienen aplicando cada movimiento, y si su
+    estado es mutable también debe implementar deshaz_movimiento.
+
+    @param problema: Un objeto de la clase `Problema`.
+    @param maxit: Máximo número de iteraciones.
+    @param tenencia: Número de estados en la memoria tabú.
+    @param politica: Cómo se sacan estados de la memoria tabú llena:
+                     'fifo': el que entró primero.
+                     'lru': el que se visitó o se consultó hace más tiempo.
+    @param semilla: Semilla de la tabla de Zobrist (no se usa el
+                    generador del módulo random).
+    @param estadisticas: Un objeto `Estadisticas` a llenar (opcional)
+    @param parada: Un criterio de paro `Parada` (opcional), que se revisa
+                   después de cada iteración
+
+    @return: El estado con el menor costo encontrado
+
+    """
+    if politica not in ('fifo', 'lru'):
+        raise ValueError("Política desconocida: {}".format(politica))
+    if estadisticas is not None:
+        estadisticas.inicia()
+    if parada is not None:
+        parada.inicia()
+    estado = problema.estado_aleatorio()
+    costo = problema.costo(estado)
+    evaluaciones = 1
+
+    zobrist = _Zobrist(semilla)
+    h = zobrist.hash(estado)
+    tabu = _MemoriaTabu(tenencia, politica == 'lru')
+    tabu.agrega(h)
+    cambios = _cambios(problema)
+    estado, movimientos, delta_costo, aplica = _protocolo(
+        problema, estadisticas, 'movimientos', estado, costo)
+
+    mejor_estado, mejor_costo, en_mejor = None, costo, True
+    for iteracion in range(1, int(maxit) + 1):
+        delta, movimiento, h_movimiento = inf, None, None
+        for m in movimientos(estado):
+            d = delta_costo(estado, m)
+            evaluaciones += 1
+            if d < delta:
+                h_vecino = h
+                for i, anterior, nuevo in cambios(estado, m):
+                    h_vecino ^= zobrist(i, anterior) ^ zobrist(i, nuevo)
+                if h_vecino not in tabu or costo + d < mejor_costo:
+                    delta, movimiento, h_movimiento = d, m, h_vecino
+        if movimiento is None:
+            break
+
+        if en_mejor and delta > 0:
+            mejor_estado, en_mejor = tuple(estado), False
+        estado = aplica(estado, movimiento, delta)
+        costo += delta
+        h = h_movimiento
+        tabu.agrega(h)
+        if costo < mejor_costo:
+            mejor_costo, en_mejor = costo, True
+
+        if estadisticas is not None:
+            estadisticas.registra(None, True, costo)
+        if parada is not None and parada.detener(
+                iteracion, evaluaciones, costo, mejor_costo):
+            break
+
+    if en_mejor:
+        mejor_estado = tuple(estado)
+    if estadisticas is not None:
+        estadisticas.termina(mejor_estado, mejor_costo)
+    return mejor_estado
+
+
+def _cambios(problema):
+    """
+    La función cambios(estado, m) que usa busqueda_tabu con los movimientos
+    (o vecinos) m que genera _protocolo: la del problema si la implementa;
+    si no, se comparan el estado y el vecino, que en los casos a) y b) de
+    _protocolo se obtiene aplicando el movimiento (y deshaciéndolo, si el
+    estado es mutable).
+
+    """
+    def diferencias(estado, vecino):
+        return [(i, anterior, nuevo)
+                for i, (anterior, nuevo) in enumerate(zip(estado, vecino))
+                if anterior != nuevo]
+
+    if not _usa_movimientos(problema, 'movimientos'):
+        return diferencias
+    if _implementa(problema, 'cambios'):
+        return problema.cambios
+    if not _implementa(problema, 'estado_mutable'):
+        def cambios(estado, movimiento):
+            return diferencias(estado,
+                               problema.aplica_movimiento(estado, movimiento))
+        return cambios
+    if not _implementa(problema, 'deshaz_movimiento'):
+        raise ValueError("busqueda_tabu requiere que el problema implemente "
+                         "cambios o deshaz_movimiento")
+
+    def cambios(estado, movimiento):
+        anterior = tuple(estado)
+        problema.aplica_movimiento(estado, movimiento)
+        resultado = diferencias(anterior, estado)
+        problema.deshaz_movimiento(estado, movimiento)
+        return resultado
+    return cambios
+
+
+class _Zobrist:
+    """
+    Tabla de Zobrist: un número aleatorio de 64 bits por cada par
+    (posicion, valor), generado la primera vez que se pide. El hash de un
+    estado es el xor de los números de sus pares.
+
+    """
+    def __init__(self, semilla):
+        self._aleatorio = Random(semilla)
+        self._tabla = {}
+
+    def __call__(self, posicion, valor):
+        z = self._tabla.get((posicion, valor))
+        if z is None:
+            z = self._tabla[posicion, valor] = self._aleatorio.getrandbits(64)
+        return z
+
+    def hash(self, estado):
+        h = 0
+        for posicion, valor in enumerate(estado):
+            h ^= self(posicion, valor)
+        return h
+
+
+class _MemoriaTabu:
+    """
+    Conjunto acotado de hashes de estados, que al llenarse saca al más
+    antiguo (o al usado hace más tiempo, si lru es cierto)
+
+    """
+    def __init__(self, tenencia, lru=False):
+        self.tenencia = tenencia
+        self.lru = lru
+        self._hashes = OrderedDict()
+
+    def __contains__(self, h):
+        if h not in self._hashes:
+            return False
+        if self.lru:
+            self._hashes.move_to_end(h)
+        return True
+
+    def agrega(self, h):
+        self._hashes[h] = None
+        self._hashes.move_to_end(h)
+        if len(self._hashes) > self.tenencia:
+            self._hashes.popitem(last=False)
+
+
+def _guarda_respaldo(archivo, datos):
+    """
+    Escribe un respaldo de una búsqueda de forma atómica: primero en un
+    archivo temporal, que después reemplaza al respaldo anterior
+
+    """
+    temporal = os.fspath(archivo) + '.tmp'
+    with open(temporal, 'wb') as f:
+        pickle.dump(datos, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(temporal, archivo)
+
+
+def _lee_respaldo(archivo, busqueda, problema):
+    """
+    Lee el respaldo de una búsqueda, si existe, revisando que sea de la
+    misma búsqueda y de un problema del mismo tipo y tamaño
+
+    @return: El diccionario guardado por _guarda_respaldo, o None
+
+    """
+    if archivo is None or not os.path.exists(archivo):
+        return None
+    with open(archivo, 'rb') as f:
+        datos = pickle.load(f)
+    if datos.get('busqueda') != busqueda:
+        raise ValueError("El respaldo {} no es de {}".format(archivo,
+                                                             busqueda))
+    huella = _huella(problema, problema.estado_aleatorio())
+    if datos.get('huella') != huella:
+        raise ValueError("El respaldo {} es de otro problema: {} en lugar "
+                         "de {}".format(archivo, datos.get('huella'), huella))
+    return datos
+
+
+def _huella(problema, estado):
+    """
+    Identifica el problema de un respaldo por su clase y la longitud de
+    sus estados
+
+    """
+    clase = type(problema)
+    return clase.__module__ + '.' + clase.__qualname__, len(estado)
+
+
+def _borra_respaldo(archivo):
+    """
+    Borra el respaldo de una búsqueda que terminó, para que otra búsqueda
+    con el mismo archivo empiece de nuevo
+
+    """
+    if archivo is not None and os.path.exists(archivo):
+        os.remove(archivo)
+
+
+def _se_puede_guardar(objeto):
+    """
+    Revisa si un objeto se puede guardar con pickle
+
+    """
+    try:
+        pickle.dumps(objeto)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        return False
+    return True
+
+
+class Parada(ABC):
+    """
+    Criterio de paro para descenso_colinas y temple_simulado.
+
+    Los criterios se combinan con |, por ejemplo
+
+        ParadaTiempo(2.0) | ParadaCostoObjetivo(0)
+
+    se detiene a los dos segundos o al llegar a costo 0, lo que pase
+    primero.
+
+    """
+    def inicia(self):
+        """
+        Se llama al iniciar la búsqueda
+
+        """
+        pass
+
+    @abstractmethod
+    def detener(self, iteracion, evaluaciones, costo, mejor_costo):
+        """
+        Decide si la búsqueda se detiene
+
+        @param iteracion: Número de iteraciones realizadas
+        @param evaluaciones: Número de evaluaciones de costo (o de cambio
+                             en el costo) realizadas
+        @param costo: El costo del estado actual
+        @param mejor_costo: El menor costo encontrado
+
+        @return: True si la búsqueda se debe detener
+
+        """
+        raise NotImplementedError("Este metodo debe ser implementado")
+
+    def __or__(self, otra):
+        return _ParadaCompuesta(self, otra)
+
+
+class _ParadaCompuesta(Parada):
+    """
+    Se detiene cuando cualquiera de sus criterios se detiene
+
+    """
+    def __init__(self, *criterios):
+        self.criterios = criterios
+
+    def inicia(self):
+        for criterio in self.criterios:
+            criterio.inicia()
+
+    def detener(self, iteracion, evaluaciones, costo, mejor_costo):
+        return any([
+            criterio.detener(iteracion, evaluaciones, costo, mejor_costo)
+            for criterio in self.criterios
+        ])
+
+
+class ParadaTiempo(Parada):
+    """
+    Se detiene después de un número de segundos de reloj
+
+    """
+    def __init__(self, segundos):
+        self.segundos = segundos
+        self._limite = None
+
+    def inicia(self):
+        self._limite = perf_counter() + self.segundos
+
+    def detener(self, iteracion, evaluaciones, costo, mejor_costo):
+        return perf_counter() >= self._limite
+
+
+class ParadaEvaluaciones(Parada):
+    """
+    Se detiene después de un número de evaluaciones de costo
+
+    """
+    def __init__(self, maximo):
+        self.maximo = maximo
+
+    def detener(self, iteracion, evaluaciones, costo, mejor_costo):
+        return evaluaciones >= self.maximo
+
+
+class ParadaCostoObjetivo(Parada):
+    """
+    Se detiene al encontrar un estado con costo menor o igual al objetivo
+
+    """
+    def __init__(self, objetivo):
+        self.objetivo = objetivo
+
+    def detener(self, iteracion, evaluaciones, costo, mejor_costo):
+        return mejor_costo <= self.objetivo
+
+
+class _ParadaEvento(Parada):
+    """
+    Se detiene cuando otro proceso activa un multiprocessing.Event (que se
+    revisa cada 100 iteraciones, porque consultarlo requiere un candado)
+
+    """
+    def __init__(self, evento):
+        self.evento = evento
+
+    def detener(self, iteracion, evaluaciones, costo, mejor_costo):
+        return iteracion % 100 == 0 and self.evento.is_set()
+
+
+class ParadaEstancamiento(Parada):
+    """
+    Se detiene si el menor costo encontrado no mejora en k iteraciones
+
+    """
+    def __init__(self, k):
+        self.k = k
+        self._mejor_costo = inf
+        self._iteracion = 0
+
+    def inicia(self):
+        self._mejor_costo, self._iteracion = inf, 0
+
+    def detener(self, iteracion, evaluaciones, costo, mejor_costo):
+        if mejor_costo < self._mejor_costo:
+            self._mejor_costo, self._iteracion = mejor_costo, iteracion
+        return iteracion - self._iteracion >= self.k
+
+
+def _temperatura_inicial(problema, estadisticas=None, parada=None):
+    """
+    Calibra la temperatura inicial como el doble de la diferencia entre
+    el mayor y el menor costo de una muestra de estados aleatorios (que se
+    evalúan con costo_lote, de 100 en 100)
+
+    Las evaluaciones de la muestra son parte de la búsqueda que calibra:
+    se cronometran en sus estadísticas, y después de cada grupo de 100 se
+    revisa su criterio de paro (con costo infinito, porque los estados de
+    la muestra no son estados de la búsqueda), que detiene la muestra.
+
+    @return: Una tupla (T_ini, evaluaciones)
+
+    """
+    costo_lote, = _metodos(problema, estadisticas, 'costo_lote')
+    muestras = 10 * len(problema.estado_aleatorio())
+    costos = []
+    for inicio in range(0, muestras, 100):
+        costos.extend(costo_lote([
+            problema.estado_aleatorio()
+            for _ in range(min(100, muestras - inicio))
+        ]))
+        if parada is not None and parada.detener(0, len(costos), inf, inf):
+            break
+    minimo,  maximo = min(costos), max(costos)
+    return 2 * (maximo - minimo), len(costos)
+
+
+def calibra_temperatura(problema, aceptacion=0.8, muestras=None,
+                        estado=None):
+    """
+    Calibra la temperatura inicial a partir de los incrementos de costo
+    entre vecinos.
+
+    Se hace una caminata aleatoria desde un estado aleatorio, aceptando
+    todos los vecinos, y se toma el promedio de los incrementos de costo
+    positivos. La temperatura es aquella con la que un incremento promedio
+    se acepta con probabilidad `aceptacion`.
+
+    Esta temperatura suele ser mucho menor que la de la calendarización
+    por default de temple_simulado, con la que T_ini / (1 + i) llegaría a
+    tol demasiado pronto. Conviene usarla con un número de iteraciones
+    fijo, por ejemplo 300 por cada elemento del estado:
+
+        T_ini = calibra_temperatura(problema)
+        temple_simulado(problema, calendario_presupuesto(T_ini, 300 * n))
+
+    @param problema: Un objeto de la clase `Problema`.
+    @param aceptacion: Probabilidad inicial de aceptar un incremento.
+    @param muestras: Número de vecinos a muestrear (por default, 10 veces
+                     la longitud del estado).
+    @param estado: Estado desde el que empieza la caminata (por default,
+                   un estado aleatorio).
+
+    @return: La temperatura inicial (0 si no se encontraron incrementos)
+
+    """
+    if estado is None:
+        estado = problema.estado_aleatorio()
+    muestras = 10 * len(estado) if muestras is None else muestras
+    incrementos = []
+
+    estado, movimiento_aleatorio, delta_costo, aplica = _protocolo(
+        problema, None, 'movimiento_aleatorio', estado, problema.costo(estado))
+    for _ in range(muestras):
+        movimiento = movimiento_aleatorio(estado)
+        delta = delta_costo(estado, movimiento)
+        incrementos.append(delta)
+        estado = aplica(estado, movimiento, delta)
+
+    positivos = [delta for delta in incrementos if delta > 0]
+    if not positivos:
+        return 0
+    return -(sum(positivos) / len(positivos)) / log(aceptacion)
+
+
+def calendario_geometrico(T_ini, alfa=0.999, repeticiones=1):
+    """
+    Calendarización geométrica, T_k = T_ini * alfa^k
+
+    @param T_ini: Temperatura inicial.
+    @param alfa: Factor de enfriamiento (0 < alfa < 1).
+    @param repeticiones: Iteraciones a cada temperatura.
+
+    @return: Un generador de temperaturas
+
+    """
+    T = T_ini
+    while True:
+        for _ in range(repeticiones):
+            yield T
+        T *= alfa
+
+
+def calendario_presupuesto(T_ini, maxit, tol=0.001):
+    """
+    Calendarización geométrica que llega de T_ini a tol en maxit
+    iteraciones (con el mismo tol de temple_simulado)
+
+    @param T_ini: Temperatura inicial.
+    @param maxit: Número de iteraciones.
+    @param tol: Temperatura final.
+
+    @return: Un generador de temperaturas
+
+    """
+    if T_ini <= tol:
+        return iter(())
+    return calendario_geometrico(T_ini, (tol / T_ini) ** (1 / maxit))
+
+
+def calendario_lundy_mees(T_ini, beta=1e-3):
+    """
+    Calendarización de Lundy y Mees, T_(k+1) = T_k / (1 + beta * T_k)
+
+    @param T_ini: Temperatura inicial.
+    @param beta: Parámetro de enfriamiento (beta > 0).
+
+    @return: Un generador de temperaturas
+
+    """
+    T = T_ini
+    while True:
+        yield T
+        T /= 1 + beta * T
+
+
+def calendario_logaritmico(T_ini):
+    """
+    Calendarización logarítmica, T_k = T_ini * log(2) / log(k + 2).
+
+    Es la calendarización con garantía teórica de convergencia, pero es muy
+    lenta; conviene usarla con una tolerancia alta o con otro criterio de
+    paro.
+
+    @param T_ini: Temperatura inicial.
+
+    @return: Un generador de temperaturas
+
+    """
+    k = 0
+    while True:
+        yield T_ini * log(2) / log(k + 2)
+        k += 1
+
+
+class CalendarioAdaptativo:
+    """
+    Calendarización adaptativa que ajusta la temperatura para seguir una
+    tasa de aceptación objetivo, con recalentamiento.
+
+    La tasa objetivo baja geométricamente de `aceptacion_ini` a
+    `aceptacion_fin` en `maxit` iteraciones. Cada `ventana` iteraciones la
+    temperatura se reduce en un factor (1 - ajuste) si la tasa de
+    aceptación de la ventana está arriba del objetivo, y se aumenta en un
+    factor (1 + ajuste) si está abajo. Si en `paciencia` ventanas seguidas
+    no se acepta ningún vecino, la temperatura se multiplica por
+    `recalentamiento` (a lo más `recalentamientos` veces).
+
+    temple_simulado informa al calendarizador si cada vecino fue aceptado a
+    través del método registra.
+
+    """
+    def __init__(self, T_ini, maxit=100000, aceptacion_ini=0.8,
+                 aceptacion_fin=0.001, ventana=100, ajuste=0.1,
+                 paciencia=10, recalentamiento=10, recalentamientos=3):
+        self.T = T_ini
+        self.maxit = maxit
+        self.aceptacion_ini = aceptacion_ini
+        self.aceptacion_fin = aceptacion_fin
+        self.ventana = ventana
+        self.ajuste = ajuste
+        self.paciencia = paciencia
+        self.recalentamiento = recalentamiento
+        self.recalentamientos = recalentamientos
+        self.iteracion = 0
+        self._aceptados = 0
+        self._congeladas = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.iteracion >= self.maxit:
+            raise StopIteration
+        return self.T
+
+    def registra(self, aceptado):
+        """
+        Registra si el vecino propuesto a la temperatura actual fue aceptado
+
+        """
+        self.iteracion += 1
+        self._aceptados += aceptado
+        if self.iteracion % self.ventana:
+            return
+
+        objetivo = self.aceptacion_ini * (
+            self.aceptacion_fin / self.aceptacion_ini
+        ) ** (self.iteracion / self.maxit)
+        tasa = self._aceptados / self.ventana
+        self._aceptados = 0
+
+        if tasa > objetivo:
+            self.T *= 1 - self.ajuste
+        else:
+            self.T *= 1 + self.ajuste
+
+        self._congeladas = self._congeladas + 1 if tasa == 0 else 0
+        if self._congeladas >= self.paciencia and self.recalentamientos > 0:
+            self.T *= self.recalentamiento
+            self.recalentamientos -= 1
+            self._congeladas = 0
+
+
+def temple_paralelo(problema, replicas=8, T_min=None, pasos=1000,
+                    intercambios=100, procesos=None, semilla=None):
+    """
+    Busqueda local por temple simulado con intercambio de réplicas.
+
+    Se mantienen `replicas` estados, cada uno a una temperatura fija de
+    una escalera geométrica entre T_ini (calibrada como en
+    temple_simulado) y T_min. En cada ronda, cada réplica avanza `pasos`
+    pasos de Metropolis en un proceso aparte, y después las réplicas en
+    temperaturas vecinas intercambian estados con probabilidad
+    min(1, exp((1/T_i - 1/T_j) * (costo_i - costo_j))).
+
+    @param problema: Un objeto de la clase `Problema` (debe poder copiarse
+                     a otros procesos con pickle).
+    @param replicas: Número de réplicas (temperaturas).
+    @param T_min: Temperatura de la réplica más fría (por default
+                  T_ini / 1000).
+    @param pasos: Pasos de Metropolis por réplica entre intercambios.
+    @param intercambios: Número de rondas de intercambio.
+    @param procesos: Número de procesos (por default, el número de CPUs).
+    @param semilla: Semilla para las réplicas y los intercambios.
+
+    @return: El estado con el menor costo encontrado
+
+    """
+    generador = Random(semilla)
+    T_ini, _ = _temperatura_inicial(problema)
+
+    estados = [problema.estado_aleatorio() for _ in range(replicas)]
+    costos = [problema.costo(estado) for estado in estados]
+    k = min(range(replicas), key=costos.__getitem__)
+    mejor_estado, mejor_costo = estados[k], costos[k]
+    if T_ini == 0:
+        # Todos los estados de la muestra cuestan lo mismo, no hay
+        # temperaturas que probar
+        return mejor_estado
+
+    T_min = T_ini / 1000 if T_min is None else T_min
+    temperaturas = [
+        T_ini * (T_min / T_ini) ** (k / max(replicas - 1, 1))
+        for k in range(replicas)
+    ]
+
+    with ProcessPoolExecutor(max_workers=procesos,
+                             initializer=_inicia_trabajador,
+                             initargs=(problema,)) as ejecutor:
+        for ronda in range(intercambios):
+            futuros = [
+                ejecutor.submit(_metropolis, estados[k], costos[k],
+                                temperaturas[k], pasos,
+                                generador.getrandbits(64))
+                for k in range(replicas)
+            ]
+            for k, futuro in enumerate(futuros):
+                estados[k], costos[k], estado, costo = futuro.result()
+                if costo < mejor_costo:
+                    mejor_estado, mejor_costo = estado, costo
+
+            # Se alternan los pares (0, 1), (2, 3)... y (1, 2), (3, 4)...
+            for k in range(ronda % 2, replicas - 1, 2):
+                delta = ((1 / temperaturas[k] - 1 / temperaturas[k + 1]) *
+                         (costos[k] - costos[k + 1]))
+                if delta >= 0 or generador.random() < exp(delta):
+                    estados[k], estados[k + 1] = estados[k + 1], estados[k]
+                    costos[k], costos[k + 1] = costos[k + 1], costos[k]
+    return mejor_estado
+
+
+_problema_trabajador = None
+
+
+def _inicia_trabajador(problema):
+    """
+    Guarda el problema en el proceso, para no copiarlo en cada tarea
+
+    """
+    global _problema_trabajador
+    _problema_trabajador = problema
+
+
+def _metropolis(estado, costo, T, pasos, semilla):
+    """
+    Avanza una réplica de temple_paralelo a temperatura fija T
+
+    @return: Una tupla (estado, costo, mejor_estado, mejor_costo)
+
+    """
+    siembra(_problema_trabajador, semilla)
+    uniforme = _uniforme(_problema_trabajador)
+    mejor_estado, mejor_costo, en_mejor = estado, costo, False
+    estado, movimiento_aleatorio, delta_costo, aplica = _protocolo(
+        _problema_trabajador, None, 'movimiento_aleatorio', estado, costo)
+
+    for _ in range(pasos):
+        movimiento = movimiento_aleatorio(estado)
+        incremento_costo = delta_costo(estado, movimiento)
+
+        if incremento_costo <= 0 or uniforme() < exp(-incremento_costo / T):
+            if en_mejor and incremento_costo > 0:
+                mejor_estado, en_mejor = tuple(estado), False
+            estado = aplica(estado, movimiento, incremento_costo)
+            costo += incremento_costo
+            if costo < mejor_costo:
+                mejor_costo, en_mejor = costo, True
+    estado = tuple(estado)
+    if en_mejor:
+        mejor_estado = estado
+    return estado, costo, mejor_estado, mejor_costo
+
+
+def reinicios_paralelos(problema, busqueda=descenso_colinas, repeticiones=10,
+                        procesos=None, costo_objetivo=None, semilla=None,
+                        **opciones):
+    """
+    Ejecuta varias búsquedas locales independientes en paralelo, cada una
+    en un proceso con su propia semilla, y se queda con la mejor.
+
+    @param problema: Un objeto de la clase `Problema` (debe poder copiarse
+                     a otros procesos con pickle).
+    @param busqueda: La función de búsqueda a repetir (descenso_colinas o
+                     temple_simulado).
+    @param repeticiones: Número de búsquedas independientes.
+    @param procesos: Número de procesos (por default, el número de CPUs).
+    @param costo_objetivo: Si alguna búsqueda llega a un costo menor o
+                           igual, se cancelan las búsquedas pendientes, y
+                           las que ya están en ejecución se detienen a
+                           través de su criterio de paro (la función de
+                           búsqueda debe recibir parada) y sus resultados
+                           se descartan.
+    @param semilla: Semilla para generar las semillas de cada búsqueda.
+    @param opciones: Argumentos adicionales para la función de búsqueda.
+
+    @return: Una tupla (estado, estadisticas) con el mejor estado y una
+             lista con un diccionario por búsqueda terminada (en orden de
+             terminación) con su 'semilla', 'costo' y 'tiempo' en segundos.
+
+    """
+    generador = Random(semilla)
+    semillas = [generador.getrandbits(64) for _ in range(repeticiones)]
+
+    mejor_estado, mejor_costo = None, inf
+    estadisticas = []
+    cancelacion = None if costo_objetivo is None else multiprocessing.Event()
+    ejecutor = ProcessPoolExecutor(max_workers=procesos,
+                                   initializer=_inicia_reinicio,
+                                   initargs=(cancelacion,))
+    try:
+        futuros = [
+            ejecutor.submit(_reinicio, problema, busqueda, s, opciones)
+            for s in semillas
+        ]
+        for futuro in as_completed(futuros):
+            estado, costo, tiempo, s = futuro.result()
+            estadisticas.append({'semilla': s, 'costo': costo,
+                                 'tiempo': tiempo})
+            if costo < mejor_costo:
+                mejor_estado, mejor_costo = estado, costo
+            if costo_objetivo is not None and costo <= costo_objetivo:
+                break
+    finally:
+        if cancelacion is not None:
+            cancelacion.set()
+        ejecutor.shutdown(wait=True, cancel_futures=True)
+    return mejor_estado, estadisticas
+
+
+_cancelacion = None
+
+
+def _inicia_reinicio(cancelacion):
+    """
+    Guarda en el proceso el evento que cancela los reinicios en ejecución
+
+    """
+    global _cancelacion
+    _cancelacion = cancelacion
+
+
+def _reinicio(problema, busqueda, semilla, opciones):
+    """
+    Una búsqueda de reinicios_paralelos, ejecutada en un proceso aparte
+
+    """
+    if _cancelacion is not None:
+        parada = _ParadaEvento(_cancelacion)
+        if opciones.get('parada') is not None:
+            parada = opciones['parada'] | parada
+        opciones = dict(opciones, parada=parada)
+    siembra(problema, semilla)
+    inicio = perf_counter()
+    estado = busqueda(problema, **opciones)
+    return estado, problema.costo(estado), perf_counter() - inicio, semilla
+
+
+def algoritmo_genetico(problema, poblacion=100, generaciones=1000,
+                       prob_mutacion=0.2, elitismo=2, torneo=3,
+                       estadisticas=None, parada=None):
+    """
+    Busqueda por algoritmo genético.
+
+    En cada generación se conservan los `elitismo` mejores individuos, y
+    el resto de la población se reemplaza por hijos de padres elegidos por
+    torneo. Cada hijo se muta con un vecino_aleatorio con probabilidad
+    `prob_mutacion`. Los hijos de cada generación se evalúan juntos con
+    costo_lote.
+
+    @param problema: Un objeto de la clase `Problema` que implemente cruza.
+    @param poblacion: Número de individuos.
+    @param generaciones: Máximo número de generaciones.
+    @param prob_mutacion: Probabilidad de mutar a un hijo.
+    @param elitismo: Número de mejores individuos que pasan sin cambio a
+                     la siguiente generación.
+    @param torneo: Número de individuos que compiten por ser padre.
+    @param estadisticas: Un objeto `Estadisticas` a llenar (opcional), con
+                         una iteración por generación.
+    @param parada: Un criterio de paro `Parada` (opcional), que se revisa
+                   después de cada generación
+
+    @return: El estado con el menor costo encontrado
+
+    """
+    if not _implementa(problema, 'cruza'):
+        raise NotImplementedError(
+            "algoritmo_genetico requiere que el problema implemente cruza")
+    if estadisticas is not None:
+        estadisticas.inicia()
+    if parada is not None:
+        parada.inicia()
+    costo_lote, cruza, vecino_aleatorio = _metodos(
+        problema, estadisticas, 'costo_lote', 'cruza', 'vecino_aleatorio')
+
+    individuos = [problema.estado_aleatorio() for _ in range(poblacion)]
+    costos = list(costo_lote(individuos))
+    evaluaciones = poblacion
+    k = min(range(poblacion), key=costos.__getitem__)
+    mejor_estado, mejor_costo = individuos[k], costos[k]
+
+    def padre():
+        return individuos[min(sample(range(poblacion), torneo),
+                              key=costos.__getitem__)]
+
+    for generacion in range(1, generaciones + 1):
+        elite = sorted(range(poblacion), key=costos.__getitem__)[:elitismo]
+        hijos = []
+        for _ in range(poblacion - len(elite)):
+            hijo = cruza(padre(), padre())
+            if random() < prob_mutacion:
+                hijo = vecino_aleatorio(hijo)
+            hijos.append(hijo)
+
+        individuos = [individuos[k] for k in elite] + hijos
+        costos = [costos[k] for k in elite] + list(costo_lote(hijos))
+        evaluaciones += len(hijos)
+        k = min(range(poblacion), key=costos.__getitem__)
+        if costos[k] < mejor_costo:
+            mejor_estado, mejor_costo = individuos[k], costos[k]
+
+        if estadisticas is not None:
+            estadisticas.registra(None, True, mejor_costo)
+        if parada is not None and parada.detener(
+                generacion, evaluaciones, costos[k], mejor_costo):
+            break
+
+    if estadisticas is not None:
+        estadisticas.termina(mejor_estado, mejor_costo)
+    return mejor_estado
+
+
+def temple_multiple(problema, cadenas=32, calendarizador=None, tol=0.001,
+                    estadisticas=None, parada=None):
+    """
+    Busqueda local por temple simulado con varias cadenas independientes
+    que avanzan juntas.
+
+    En cada iteración, cada cadena propone un vecino_aleatorio, y todos
+    los vecinos se evalúan juntos con costo_lote. Cada cadena acepta o
+    rechaza su vecino con el criterio de Metropolis, a la temperatura
+    común de la iteración.
+
+    @param problema: Un objeto de la clase `Problema`.
+    @param cadenas: Número de cadenas.
+    @param calendarizador: Un generador de temperatura, como en
+                           temple_simulado. Si tiene un método registra, se
+                           le informa en cada iteración la fracción de
+                           cadenas que aceptaron su vecino.
+    @param tol: Temperatura mínima considerada diferente a cero.
+    @param estadisticas: Un objeto `Estadisticas` a llenar (opcional).
+                         Cada vecino propuesto cuenta como una iteración.
+    @param parada: Un criterio de paro `Parada` (opcional), que se revisa
+                   después de cada iteración
+
+    @return: El estado con el menor costo encontrado
+
+    """
+    if estadisticas is not None:
+        estadisticas.inicia()
+    if parada is not None:
+        parada.inicia()
+    calibracion = 0
+    if calendarizador is None:
+        T_ini, calibracion = _temperatura_inicial(problema, estadisticas,
+                                                  parada)
+        calendarizador = (T_ini/(1 + i) for i in range(int(1e10)))
+    registra = getattr(calendarizador, 'registra', None)
+    uniforme = _uniforme(problema)
+
+    vecino_aleatorio, costo_lote = _metodos(
+        problema, estadisticas, 'vecino_aleatorio', 'costo_lote')
+
+    estados = [problema.estado_aleatorio() for _ in range(cadenas)]
+    costos = list(costo_lote(estados))
+    k = min(range(cadenas), key=costos.__getitem__)
+    mejor_estado, mejor_costo = estados[k], costos[k]
+
+    for iteracion, T in enumerate(takewhile(lambda i: i > tol,
+                                            calendarizador), 1):
+        vecinos = [vecino_aleatorio(estado) for estado in estados]
+        aceptados = 0
+        for k, costo_vecino in enumerate(costo_lote(vecinos)):
+            incremento_costo = costo_vecino - costos[k]
+            aceptado = (incremento_costo <= 0 or
+                        uniforme() < exp(-incremento_costo / T))
+            if aceptado:
+                estados[k], costos[k] = vecinos[k], costo_vecino
+                aceptados += 1
+                if costo_vecino < mejor_costo:
+                    mejor_estado, mejor_costo = vecinos[k], costo_vecino
+            if estadisticas is not None:
+                estadisticas.registra(T, aceptado, costos[k])
+        if registra is not None:
+            registra(aceptados / cadenas)
+        if parada is not None and parada.detener(
+                iteracion, calibracion + cadenas * (iteracion + 1),
+                min(costos),
+                mejor_costo):
+            break
 
-        if incremento_costo <= 0 or random() < exp(-incremento_costo / T):
-            estado, costo = vecino, costo_vecino
-    return estado
+    if estadisticas is not None:
+        estadisticas.termina(mejor_estado, mejor_costo)
+    return mejor_estado
@@ -17,6 +17,15 @@ desde la termnal se puede instalar utilizando
 
 $pip install pillow
 
+De manera opcional, si se cuenta con NumPy, los criterios de cruces y de
+separación entre vértices se pueden calcular en forma vectorizada, o bien
+para grafos grandes, utilizando una rejilla uniforme sobre la imagen (ver el
+parámetro motor de problema_grafica_grafo).
+
+Los grafos grandes se pueden leer de un archivo de aristas (en texto o
+binario) con lee_aristas, y la trayectoria de una búsqueda se puede guardar
+como un GIF animado con Trayectoria.
+
 """
 
 __author__ = 'Escribe aquí tu nombre'
@@ -26,8 +35,20 @@ import random
 import itertools
 import math
 import time
+import mmap
+import os
+import queue
+import sys
+import threading
+from array import array
+from collections import defaultdict
 from PIL import Image, ImageDraw
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 
 class problema_grafica_grafo(blocales.Problema):
 
@@ -36,7 +57,32 @@ class problema_grafica_grafo(blocales.Problema):
 
     """
 
-    def __init__(self, vertices, aristas, dimension_imagen=400):
+    # Factores lineales para los criterios del costo (por default solo
+    # cuenta el criterio 1)
+    K1 = 1.0
+    K2 = 0.0
+    K3 = 0.0
+    K4 = 0.0
+
+    # Factor y método de cada criterio, del más barato al más caro
+    CRITERIOS = (('K3', 'angulo_aristas'),
+                 ('K4', 'criterio_propio'),
+                 ('K2', 'separacion_vertices'),
+                 ('K1', 'numero_de_cruces'))
+
+    # Métodos que calculan los criterios, completos o en forma incremental
+    # (_cruces_arista y _separacion_vertice, que usa delta_costo)
+    METODOS_PERFIL = ('numero_de_cruces', '_cruces_arista',
+                      'separacion_vertices', '_separacion_vertice',
+                      'angulo_aristas', 'criterio_propio')
+
+    # Máximo de pares de aristas (o de vértices) que costo_lote evalúa a la
+    # vez con NumPy, sumando los de todos los estados del bloque
+    MAX_ELEMENTOS_LOTE = 2 ** 20
+
+    def __init__(self, vertices, aristas, dimension_imagen=400,
+                 motor='python', tam_celda=50, pesos=None, perfil=False,
+                 aleatorio=None, dmax=10):
         """
         Un grafo se define como un conjunto de vertices, en forma de
         lista (no conjunto, el orden es importante a la hora de
@@ -48,14 +94,89 @@ class problema_grafica_grafo(blocales.Problema):
 
         @param vertices: Lista con el nombre de los vertices.
         @param aristas: Lista con pares de vertices, los cuales
-                        definen las aristas.
+                        definen las aristas, o bien un arreglo de enteros
+                        con los pares de índices de los vértices, como los
+                        que regresa lee_aristas.
         @param dimension_imagen: Entero con la dimension de la imagen
                                  en pixeles (cuadrada por facilidad).
+        @param motor: 'python', 'numpy' o 'rejilla'. Con 'numpy' los
+                      cruces y la separación entre vértices se calculan con
+                      operaciones vectorizadas (si NumPy no está instalado
+                      se usa 'python'). Con 'rejilla' las aristas y los
+                      vértices se guardan en las celdas de una rejilla
+                      uniforme, y solo se comparan los que comparten celda
+                      o están en celdas cercanas.
+        @param tam_celda: Tamaño en pixeles de las celdas de la rejilla.
+        @param pesos: Tupla (K1, K2, K3, K4) con los factores de los
+                      criterios del costo de esta instancia (por default,
+                      los de la clase). Los criterios con factor cero no
+                      se calculan.
+        @param perfil: Si es verdadero, se activa el perfil de los
+                       criterios (ver perfila).
+        @param aleatorio: Un blocales.Aleatorio del que se toman los
+                          vecinos y movimientos aleatorios (por default, del
+                          módulo random).
+        @param dmax: Máximo desplazamiento en pixeles de una coordenada en
+                     vecino_aleatorio y movimiento_aleatorio.
 
         """
         self.vertices = vertices
         self.aristas = aristas
         self.dim = dimension_imagen
+        self.motor = motor if motor != 'numpy' or np is not None else 'python'
+        self.tam_celda = tam_celda
+        if pesos is not None:
+            self.K1, self.K2, self.K3, self.K4 = pesos
+        self.aleatorio = aleatorio
+        self.dmax = dmax
+        self.perfil = None
+        if perfil:
+            self.perfila()
+
+        # Las aristas como pares de índices de la coordenada x de cada
+        # vértice en el estado, y las aristas incidentes a cada vértice
+        self._aristas = [(2 * i, 2 * j)
+                         for (i, j) in _indices_aristas(vertices, aristas)]
+        self._incidentes = [[] for _ in vertices]
+        for k, (i, j) in enumerate(self._aristas):
+            self._incidentes[i // 2].append(k)
+            if j != i:
+                self._incidentes[j // 2].append(k)
+
+        # Posiciones y tabla de cruces por arista del último estado movido,
+        # y cruces calculados para el último movimiento evaluado
+        self._estado = None
+        self._posiciones = None
+        self._cruces = None
+        self._pendiente = None
+
+        # Rejilla del último estado movido: aristas por celda, celdas de
+        # cada arista y vértices por celda
+        self._rejilla = None
+        self._celdas = None
+        self._rejilla_vertices = None
+
+        self._np_pares = None
+        if self.motor == 'numpy':
+            self._indices_np()
+
+    def _indices_np(self):
+        """
+        Calcula (una sola vez) los índices de las coordenadas x de los
+        extremos de cada arista, de todos los pares de aristas y de todos
+        los pares de vértices, que usan los cálculos con NumPy
+
+        """
+        if self._np_pares is None:
+            self._np_origen = np.array([i for (i, _) in self._aristas],
+                                       dtype=np.intp)
+            self._np_destino = np.array([j for (_, j) in self._aristas],
+                                        dtype=np.intp)
+            a, b = np.triu_indices(len(self._aristas), 1)
+            self._np_pares = (self._np_origen[a], self._np_destino[a],
+                              self._np_origen[b], self._np_destino[b])
+            a, b = np.triu_indices(len(self.vertices), 1)
+            self._np_pares_vertices = (2 * a, 2 * b)
 
     def estado_aleatorio(self):
         """
@@ -94,7 +215,7 @@ class problema_grafica_grafo(blocales.Problema):
                                 vecino[i] + random.randint(-10, 10)))
             yield tuple(vecino)
     
-    def vecino_aleatorio(self, estado, dmax=10):
+    def vecino_aleatorio(self, estado, dmax=None):
         """
         Encuentra un vecino en forma aleatoria. En estea primera
         versión lo que hacemos es tomar un valor aleatorio, y
@@ -105,17 +226,18 @@ class problema_grafica_grafo(blocales.Problema):
         hacer un mejor vecino en el algoritmo de temple simulado.
 
         @param estado: Una tupla con el estado.
-        @param dispersion: Un flotante con el valor de dispersión para el
-                           vertice seleccionado
+        @param dmax: Máximo desplazamiento en pixeles de la coordenada
+                     seleccionada (por default, self.dmax).
 
         @return: Una tupla con un estado vecino al estado de entrada.
 
         """
+        dmax = self.dmax if dmax is None else dmax
         vecino = list(estado)
-        i = random.randint(0, len(vecino) - 1)
+        i = self._entero(0, len(vecino) - 1)
         vecino[i] = max(10,
                         min(self.dim - 10,
-                            vecino[i] + random.randint(-dmax,  dmax)))
+                            vecino[i] + self._entero(-dmax,  dmax)))
         return tuple(vecino)
 
         #######################################################################
@@ -126,6 +248,313 @@ class problema_grafica_grafo(blocales.Problema):
         # Propon una manera alternativa de vecino_aleatorio y muestra que
         # con tu propuesta se obtienen resultados mejores o en menor tiempo
 
+    def cruza(self, estado1, estado2):
+        """
+        Cruza uniforme por vértice: cada vértice toma su posición (x, y) de
+        alguno de los dos padres al azar.
+
+        @return: Una tupla con el estado hijo.
+
+        """
+        hijo = []
+        for x in range(0, len(estado1), 2):
+            padre = estado1 if random.random() < 0.5 else estado2
+            hijo.extend(padre[x:x + 2])
+        return tuple(hijo)
+
+    def movimientos(self, estado):
+        """
+        Generador de movimientos equivalente a vecinos. Un movimiento es
+        una tupla (i, anterior, nuevo) que cambia el valor de estado[i].
+
+        """
+        for i in range(len(estado)):
+            yield (i, estado[i],
+                   max(10, min(self.dim - 10,
+                               estado[i] + random.randint(-10, 10))))
+
+    def movimiento_aleatorio(self, estado, dmax=None):
+        """
+        Movimiento aleatorio equivalente a vecino_aleatorio.
+
+        """
+        dmax = self.dmax if dmax is None else dmax
+        i = self._entero(0, len(estado) - 1)
+        return (i, estado[i],
+                max(10, min(self.dim - 10,
+                            estado[i] + self._entero(-dmax, dmax))))
+
+    def _entero(self, a, b):
+        """
+        Un entero al azar en [a, b], del módulo random o del Aleatorio del
+        problema
+
+        """
+        if self.aleatorio is None:
+            return random.randint(a, b)
+        return self.aleatorio.enteros(a, b)()
+
+    def cambios(self, estado, movimiento):
+        """
+        Un movimiento (i, anterior, nuevo) solo cambia estado[i]
+
+        """
+        return (movimiento,)
+
+    def delta_costo(self, estado, movimiento):
+        """
+        Calcula el cambio en el costo al mover una coordenada de un vértice.
+
+        Solo se recalculan los cruces de las aristas incidentes al vértice
+        movido, O(grado * E), que se comparan con los de la tabla de cruces
+        del estado actual, y la separación del vértice con el resto, O(V).
+        Los criterios angulo_aristas y criterio_propio se recalculan
+        completos. Los criterios con factor cero no se calculan.
+
+        @param estado: Una tupla con el estado.
+        @param movimiento: Una tupla (i, anterior, nuevo).
+
+        @return: costo(vecino) - costo(estado)
+
+        """
+        self._sincroniza(estado)
+        i, anterior, nuevo = movimiento
+        posiciones = self._posiciones
+        x = i - i % 2
+
+        delta = 0
+        if self.K2 != 0:
+            delta -= self.K2 * self._separacion_vertice(posiciones, x)
+        if self.K3 != 0 or self.K4 != 0:
+            delta -= (self.K3 * self.angulo_aristas(posiciones) +
+                      self.K4 * self.criterio_propio(posiciones))
+
+        posiciones[i] = nuevo
+        if self.K2 != 0:
+            delta += self.K2 * self._separacion_vertice(posiciones, x)
+        if self.K3 != 0 or self.K4 != 0:
+            delta += (self.K3 * self.angulo_aristas(posiciones) +
+                      self.K4 * self.criterio_propio(posiciones))
+        if self.K1 != 0:
+            cruces = {k: self._cruces_arista(posiciones, k)
+                      for k in self._incidentes[i // 2]}
+            delta += self.K1 * (self._pares_cruzados(cruces) -
+                                self._pares_cruzados(self._cruces, cruces))
+            self._pendiente = (estado, movimiento, cruces)
+        posiciones[i] = anterior
+        return delta
+
+    def aplica_movimiento(self, estado, movimiento):
+        """
+        Aplica un movimiento y actualiza la tabla de cruces
+
+        @param estado: Una tupla con el estado, o un estado mutable que se
+                       modifica en su lugar.
+        @param movimiento: Una tupla (i, anterior, nuevo).
+
+        @return: El estado vecino.
+
+        """
+        self._sincroniza(estado)
+        i, anterior, nuevo = movimiento
+        self._posiciones[i] = nuevo
+
+        if self._cruces is not None:
+            if (self._pendiente is not None and
+                    self._pendiente[0] is estado and
+                    self._pendiente[1] == movimiento):
+                cruces = self._pendiente[2]
+            else:
+                cruces = {k: self._cruces_arista(self._posiciones, k)
+                          for k in self._incidentes[i // 2]}
+            for k, nuevos in cruces.items():
+                for f in self._cruces[k] - nuevos:
+                    self._cruces[f].discard(k)
+                for f in nuevos - self._cruces[k]:
+                    self._cruces[f].add(k)
+                self._cruces[k] = nuevos
+
+        if self.motor == 'rejilla':
+            for k in self._incidentes[i // 2]:
+                for celda in self._celdas[k]:
+                    self._rejilla[celda].discard(k)
+                self._celdas[k] = self._celdas_arista(self._posiciones, k)
+                for celda in self._celdas[k]:
+                    self._rejilla[celda].add(k)
+            x = i - i % 2
+            anterior_xy = ((anterior, self._posiciones[x + 1]) if i == x else
+                           (self._posiciones[x], anterior))
+            self._rejilla_vertices[self._celda(*anterior_xy)].discard(x)
+            self._rejilla_vertices[self._celda(
+                self._posiciones[x], self._posiciones[x + 1])].add(x)
+
+        if type(estado) is tuple:
+            estado = tuple(self._posiciones)
+        self._estado = estado
+        self._pendiente = None
+        return estado
+
+    def estado_mutable(self, estado):
+        """
+        El estado como una lista, que se modifica en su lugar
+
+        """
+        return list(estado)
+
+    def deshaz_movimiento(self, estado, movimiento):
+        """
+        Deshace un movimiento (i, anterior, nuevo) regresando estado[i] a su
+        valor anterior
+
+        """
+        i, anterior, nuevo = movimiento
+        return self.aplica_movimiento(estado, (i, nuevo, anterior))
+
+    def _sincroniza(self, estado):
+        """
+        Reconstruye la tabla de cruces si `estado` no es el último estado
+        que se movió. Las posiciones de un estado mutable son el estado
+        mismo. La tabla de cruces solo se mantiene si K1 es distinto de
+        cero.
+
+        """
+        if estado is not self._estado or (self._cruces is None and
+                                          self.K1 != 0):
+            self._posiciones = (list(estado) if type(estado) is tuple else
+                                estado)
+            if self.motor == 'rejilla':
+                self._celdas = [self._celdas_arista(estado, k)
+                                for k in range(len(self._aristas))]
+                self._rejilla = defaultdict(set)
+                for k, celdas in enumerate(self._celdas):
+                    for celda in celdas:
+                        self._rejilla[celda].add(k)
+                self._rejilla_vertices = defaultdict(set)
+                for x in range(0, len(estado), 2):
+                    self._rejilla_vertices[
+                        self._celda(estado[x], estado[x + 1])].add(x)
+            self._cruces = None
+            if self.K1 != 0:
+                self._cruces = [self._cruces_arista(estado, k)
+                                for k in range(len(self._aristas))]
+            self._estado = estado
+            self._pendiente = None
+
+    def _cruces_arista(self, estado, k):
+        """
+        Conjunto de índices de las aristas que cruzan a la arista k
+
+        """
+        if self.motor == 'numpy':
+            # Cada par se prueba con la arista de menor índice primero
+            antes = np.arange(len(self._aristas)) < k
+            i, j = self._aristas[k]
+            cruza = self._se_cruzan_np(
+                np.asarray(estado, dtype=np.float64),
+                np.where(antes, self._np_origen, i),
+                np.where(antes, self._np_destino, j),
+                np.where(antes, i, self._np_origen),
+                np.where(antes, j, self._np_destino))
+            cruza[k] = False
+            return set(np.flatnonzero(cruza).tolist())
+
+        aristas = self._aristas
+        if self.motor == 'rejilla':
+            # Las aristas incidentes al vértice que se mueve pueden estar en
+            # celdas viejas, pero comparten vértice con k y no la cruzan
+            candidatas = set().union(*(
+                self._rejilla.get(celda, ())
+                for celda in self._celdas_arista(estado, k)))
+        else:
+            candidatas = range(len(aristas))
+        return {f for f in candidatas if f != k and
+                self._se_cruzan(estado, aristas[min(k, f)],
+                                aristas[max(k, f)])}
+
+    def _separacion_vertice(self, estado, x, min_dist=50):
+        """
+        Penalización por cercanía del vértice cuya coordenada x está en
+        estado[x] con el resto de los vértices
+
+        """
+        if self.motor == 'numpy':
+            e = np.asarray(estado, dtype=np.float64)
+            penalizacion = self._penalizacion_np(
+                e[x], e[x + 1], e[0::2], e[1::2], min_dist)
+            penalizacion[x // 2] = 0
+            return float(penalizacion.sum())
+
+        x1, y1 = estado[x], estado[x + 1]
+        if self.motor == 'rejilla':
+            candidatos = self._vertices_cercanos(self._rejilla_vertices,
+                                                 x1, y1, min_dist)
+        else:
+            candidatos = range(0, len(estado), 2)
+        return sum(
+            self._penalizacion(x1, y1, estado[j], estado[j + 1], min_dist)
+            for j in candidatos if j != x
+        )
+
+    def _celda(self, x, y):
+        """
+        Celda de la rejilla que contiene al punto (x, y)
+
+        """
+        return int(x // self.tam_celda), int(y // self.tam_celda)
+
+    def _celdas_arista(self, estado, k):
+        """
+        Lista de las celdas de la rejilla por las que pasa la arista k.
+
+        Por cada columna de celdas que abarca la arista se calcula el
+        intervalo en y del segmento dentro de la columna, ampliado un poco
+        para que un cruce sobre el borde entre dos celdas quede en ambas.
+
+        """
+        i, j = self._aristas[k]
+        x0, y0, x1, y1 = estado[i], estado[i + 1], estado[j], estado[j + 1]
+        if x1 < x0:
+            x0, y0, x1, y1 = x1, y1, x0, y0
+        tam = self.tam_celda
+        eps = 1e-6 * tam
+
+        celdas = []
+        for c in range(int(x0 // tam), int(x1 // tam) + 1):
+            if x1 == x0:
+                ya, yb = y0, y1
+            else:
+                pendiente = (y1 - y0) / (x1 - x0)
+                ya = y0 + pendiente * (max(x0, c * tam) - x0)
+                yb = y0 + pendiente * (min(x1, (c + 1) * tam) - x0)
+            if yb < ya:
+                ya, yb = yb, ya
+            celdas.extend(
+                (c, r) for r in range(int((ya - eps) // tam),
+                                      int((yb + eps) // tam) + 1))
+        return celdas
+
+    def _vertices_cercanos(self, rejilla_vertices, x, y, min_dist):
+        """
+        Vértices en las celdas a distancia a lo más min_dist de (x, y)
+
+        """
+        cx, cy = self._celda(x, y)
+        r = math.ceil(min_dist / self.tam_celda)
+        return [j for c in range(cx - r, cx + r + 1)
+                for f in range(cy - r, cy + r + 1)
+                for j in rejilla_vertices.get((c, f), ())]
+
+    @staticmethod
+    def _pares_cruzados(tabla, aristas=None):
+        """
+        Número de pares de aristas que se cruzan en los que participa alguna
+        de las aristas de `aristas` (por default las llaves de `tabla`)
+
+        """
+        aristas = tabla if aristas is None else aristas
+        return (sum(len(tabla[k]) for k in aristas) -
+                sum(len(tabla[k] & aristas.keys()) for k in aristas) // 2)
+
     def costo(self, estado):
         """
         Encuentra el costo de un estado. En principio el costo de un estado
@@ -134,26 +563,20 @@ class problema_grafica_grafo(blocales.Problema):
         Esto hace que el dibujo se organice para tener el menor numero
         posible de cruces entre aristas.
 
+        Los criterios se calculan del más barato al más caro (ver
+        CRITERIOS), y los que tienen factor cero no se calculan.
+
         @param: Una tupla con un estado
 
         @return: Un número flotante con el costo del estado.
 
         """
-
-        # Inicializa fáctores lineales para los criterios más importantes
-        # (default solo cuanta el criterio 1)
-        K1 = 1.0
-        K2 = 0.0
-        K3 = 0.0
-        K4 = 0.0
-
-        # Genera un diccionario con el estado y la posición
-        estado_dic = self.estado2dic(estado)
-
-        return (K1 * self.numero_de_cruces(estado_dic) +
-                K2 * self.separacion_vertices(estado_dic) +
-                K3 * self.angulo_aristas(estado_dic) +
-                K4 * self.criterio_propio(estado_dic))
+        costo = 0
+        for factor, criterio in self.CRITERIOS:
+            peso = getattr(self, factor)
+            if peso != 0:
+                costo += peso * getattr(self, criterio)(estado)
+        return costo
 
         # Como podras ver en los resultados, el costo inicial
         # propuesto no hace figuras particularmente bonitas, y esto es
@@ -173,55 +596,195 @@ class problema_grafica_grafo(blocales.Problema):
         # Al final, es necesario darle un peso lineal a cada uno de
         # los subcriterios.
 
-    def numero_de_cruces(self, estado_dic):
+    def costo_lote(self, estados):
+        """
+        Calcula el costo de varios estados a la vez, con los cruces y la
+        separación entre vértices vectorizados con NumPy. Los criterios
+        angulo_aristas y criterio_propio se evalúan por estado, solo si su
+        factor es distinto de cero.
+
+        Los estados se evalúan por bloques de a lo más MAX_ELEMENTOS_LOTE
+        pares (de aristas o de vértices) en total, así que la memoria no
+        crece con el número de estados. Sin NumPy, o si un solo estado
+        tiene más de MAX_ELEMENTOS_LOTE pares, se evalúa un estado a la vez
+        con costo (y su motor).
+
+        @param estados: Un arreglo de dos dimensiones, o una lista de
+                        tuplas, con un estado por renglón.
+
+        @return: Una lista con el costo de cada estado.
+
+        """
+        pares = max(len(self._aristas) * (len(self._aristas) - 1),
+                    len(self.vertices) * (len(self.vertices) - 1)) // 2
+        if np is None or pares > self.MAX_ELEMENTOS_LOTE:
+            return super().costo_lote(estados)
+        self._indices_np()
+        filas = max(1, self.MAX_ELEMENTOS_LOTE // max(pares, 1))
+        costos = []
+        for inicio in range(0, len(estados), filas):
+            costos.extend(self._costo_bloque(estados[inicio:inicio + filas]))
+        return costos
+
+    def _costo_bloque(self, estados):
+        """
+        Costo vectorizado de un bloque de estados de costo_lote
+
+        """
+        e = np.asarray(estados, dtype=np.float64)
+        costos = np.zeros(len(e))
+        if self.K1 != 0:
+            costos += self.K1 * np.count_nonzero(
+                self._se_cruzan_np(e, *self._np_pares), axis=-1)
+        if self.K2 != 0:
+            i, j = self._np_pares_vertices
+            costos += self.K2 * self._penalizacion_np(
+                e[:, i], e[:, i + 1], e[:, j], e[:, j + 1]).sum(axis=-1)
+        if self.K3 != 0 or self.K4 != 0:
+            costos += [self.K3 * self.angulo_aristas(estado) +
+                       self.K4 * self.criterio_propio(estado)
+                       for estado in estados]
+        return costos.tolist()
+
+    def perfila(self, activo=True):
+        """
+        Activa (o desactiva) el perfil de los criterios del costo: cada
+        método de METODOS_PERFIL se sustituye en la instancia por una versión
+        que cuenta sus llamadas y el tiempo acumulado, en el diccionario
+        self.perfil = {metodo: [llamadas, segundos]}. Mientras el perfil
+        está activo, la instancia no se puede copiar a otros procesos.
+
+        """
+        for nombre in self.METODOS_PERFIL:
+            self.__dict__.pop(nombre, None)
+        self.perfil = None
+        if not activo:
+            return
+        self.perfil = {}
+        for nombre in self.METODOS_PERFIL:
+            metodo = getattr(self, nombre)
+            registro = self.perfil[nombre] = [0, 0.0]
+
+            def cronometrado(*args, metodo=metodo, registro=registro):
+                inicio = time.perf_counter()
+                try:
+                    return metodo(*args)
+                finally:
+                    registro[0] += 1
+                    registro[1] += time.perf_counter() - inicio
+            setattr(self, nombre, cronometrado)
+
+    def reporte_perfil(self):
+        """
+        @return: Una cadena con el perfil de los criterios, del método con
+                 más tiempo al de menos
+
+        """
+        if self.perfil is None:
+            return "El perfil no está activo"
+        renglones = ["{:<22}{:>12}{:>14}".format('metodo', 'llamadas',
+                                                 'segundos')]
+        for nombre, (llamadas, segundos) in sorted(
+                self.perfil.items(), key=lambda item: -item[1][1]):
+            renglones.append("{:<22}{:>12}{:>14.4f}".format(
+                nombre, llamadas, segundos))
+        return "\n".join(renglones)
+
+    def numero_de_cruces(self, estado):
         """
         Devuelve el numero de veces que dos aristas se cruzan en el grafo
-        si se grafica como dice estado_dic
+        si se grafica como dice estado
 
-        @param estado_dic: Diccionario cuyas llaves son los vértices
-                           del grafo y cuyos valores es una tupla con
-                           la posición (x, y) de ese vértice en el
-                           dibujo.
+        @param estado: Una tupla con las posiciones (x1, y1, x2, y2, ...)
+                       de cada vértice en el dibujo.
 
         @return: Un número.
 
         """
-        total = 0
+        if self.motor == 'numpy':
+            e = np.asarray(estado, dtype=np.float64)
+            return int(np.count_nonzero(self._se_cruzan_np(
+                e, *self._np_pares)))
+
+        if self.motor == 'rejilla':
+            # Solo los pares de aristas que comparten alguna celda
+            rejilla = defaultdict(list)
+            for k in range(len(self._aristas)):
+                for celda in self._celdas_arista(estado, k):
+                    rejilla[celda].append(k)
+            pares = {par for aristas in rejilla.values()
+                     for par in itertools.combinations(aristas, 2)}
+            return sum(self._se_cruzan(estado, self._aristas[a],
+                                       self._aristas[b])
+                       for (a, b) in pares)
 
         # Por cada arista en relacion a las otras (todas las combinaciones de
         # aristas)
-        for (aristaA, aristaB) in itertools.combinations(self.aristas, 2):
-
-            # Encuentra los valores de (x0A,y0A), (xFA, yFA) para los
-            # vertices de una arista y los valores (x0B,y0B), (x0B,
-            # y0B) para los vertices de la otra arista
-            (x0A, y0A) = estado_dic[aristaA[0]]
-            (xFA, yFA) = estado_dic[aristaA[1]]
-            (x0B, y0B) = estado_dic[aristaB[0]]
-            (xFB, yFB) = estado_dic[aristaB[1]]
-
-            # Utilizando la clasica formula para encontrar
-            # interseccion entre dos lineas cuidando primero de
-            # asegurarse que las lineas no son paralelas (para evitar
-            # la división por cero)
-            den = (xFA - x0A) * (yFB - y0B) - (xFB - x0B) * (yFA - y0A)
-            if den == 0:
-                continue
+        return sum(
+            self._se_cruzan(estado, aristaA, aristaB)
+            for (aristaA, aristaB) in itertools.combinations(self._aristas, 2)
+        )
+
+    @staticmethod
+    def _se_cruzan(estado, aristaA, aristaB):
+        """
+        Revisa si dos aristas, dadas como pares de índices de la coordenada
+        x de sus vértices en el estado, se cruzan si el grafo se grafica
+        como dice estado
+
+        """
+        # Encuentra los valores de (x0A,y0A), (xFA, yFA) para los
+        # vertices de una arista y los valores (x0B,y0B), (x0B,
+        # y0B) para los vertices de la otra arista
+        (iA, jA), (iB, jB) = aristaA, aristaB
+        x0A, y0A = estado[iA], estado[iA + 1]
+        xFA, yFA = estado[jA], estado[jA + 1]
+        x0B, y0B = estado[iB], estado[iB + 1]
+        xFB, yFB = estado[jB], estado[jB + 1]
+
+        # Utilizando la clasica formula para encontrar
+        # interseccion entre dos lineas cuidando primero de
+        # asegurarse que las lineas no son paralelas (para evitar
+        # la división por cero)
+        den = (xFA - x0A) * (yFB - y0B) - (xFB - x0B) * (yFA - y0A)
+        if den == 0:
+            return False
+
+        # Y entonces sacamos el largo del cruce, normalizado por
+        # den. Esto significa que en 0 se encuentran en la primer
+        # arista y en 1 en la última. Si los puntos de cruce de
+        # ambas lineas se encuentran en valores entre 0 y 1,
+        # significa que se cruzan
+        puntoA = ((xFB - x0B) * (y0A - y0B) -
+                  (yFB - y0B) * (x0A - x0B)) / den
+        puntoB = ((xFA - x0A) * (y0A - y0B) -
+                  (yFA - y0A) * (x0A - x0B)) / den
+        return 0 < puntoA < 1 and 0 < puntoB < 1
+
+    @staticmethod
+    def _se_cruzan_np(estado, iA, jA, iB, jB):
+        """
+        Versión vectorizada de _se_cruzan sobre arreglos de índices. Si
+        `estado` es un arreglo de dos dimensiones, se revisa cada renglón.
+
+        @return: Un arreglo booleano, verdadero en los pares que se cruzan
+
+        """
+        x0A, y0A = estado[..., iA], estado[..., iA + 1]
+        xFA, yFA = estado[..., jA], estado[..., jA + 1]
+        x0B, y0B = estado[..., iB], estado[..., iB + 1]
+        xFB, yFB = estado[..., jB], estado[..., jB + 1]
 
-            # Y entonces sacamos el largo del cruce, normalizado por
-            # den. Esto significa que en 0 se encuentran en la primer
-            # arista y en 1 en la última. Si los puntos de cruce de
-            # ambas lineas se encuentran en valores entre 0 y 1,
-            # significa que se cruzan
+        den = (xFA - x0A) * (yFB - y0B) - (xFB - x0B) * (yFA - y0A)
+        with np.errstate(divide='ignore', invalid='ignore'):
             puntoA = ((xFB - x0B) * (y0A - y0B) -
                       (yFB - y0B) * (x0A - x0B)) / den
             puntoB = ((xFA - x0A) * (y0A - y0B) -
                       (yFA - y0A) * (x0A - x0B)) / den
-            if 0 < puntoA < 1 and 0 < puntoB < 1:
-                total += 1
-        return total
+        return ((den != 0) & (0 < puntoA) & (puntoA < 1) &
+                (0 < puntoB) & (puntoB < 1))
 
-    def separacion_vertices(self, estado_dic, min_dist=50):
+    def separacion_vertices(self, estado, min_dist=50):
         """
         A partir de una posicion "estado" devuelve una penalización
         proporcional a cada par de vertices que se encuentren menos
@@ -229,28 +792,64 @@ class problema_grafica_grafo(blocales.Problema):
         min_dist, entonces calcula una penalización proporcional a
         esta.
 
-        @param estado_dic: Diccionario cuyas llaves son los vértices
-                           del grafo y cuyos valores es una tupla con
-                           la posición (x, y) de ese vértice en el
-                           dibujo.  @param min_dist: Mínima distancia
-                           aceptable en pixeles entre dos vértices en
-                           el dibujo.
+        @param estado: Una tupla con las posiciones (x1, y1, x2, y2, ...)
+                       de cada vértice en el dibujo.
+        @param min_dist: Mínima distancia aceptable en pixeles entre dos
+                         vértices en el dibujo.
 
         @return: Un número.
 
         """
-        total = 0
-        for (v1, v2) in itertools.combinations(self.vertices, 2):
-            # Calcula la distancia entre dos vertices
-            (x1, y1), (x2, y2) = estado_dic[v1], estado_dic[v2]
-            dist = math.sqrt((x1 - x2) ** 2 + (y1 - y2) ** 2)
+        if self.motor == 'numpy':
+            e = np.asarray(estado, dtype=np.float64)
+            i, j = self._np_pares_vertices
+            return float(self._penalizacion_np(
+                e[i], e[i + 1], e[j], e[j + 1], min_dist).sum())
+
+        if self.motor == 'rejilla':
+            rejilla_vertices = defaultdict(list)
+            for i in range(0, len(estado), 2):
+                celda = self._celda(estado[i], estado[i + 1])
+                rejilla_vertices[celda].append(i)
+            return sum(
+                self._penalizacion(estado[i], estado[i + 1],
+                                   estado[j], estado[j + 1], min_dist)
+                for i in range(0, len(estado), 2)
+                for j in self._vertices_cercanos(rejilla_vertices, estado[i],
+                                                 estado[i + 1], min_dist)
+                if i < j
+            )
+
+        return sum(
+            self._penalizacion(estado[i], estado[i + 1],
+                               estado[j], estado[j + 1], min_dist)
+            for (i, j) in itertools.combinations(range(0, len(estado), 2), 2)
+        )
+
+    @staticmethod
+    def _penalizacion(x1, y1, x2, y2, min_dist=50):
+        """
+        Penalización por la cercanía entre dos vértices
+
+        """
+        # Calcula la distancia entre dos vertices
+        dist = math.sqrt((x1 - x2) ** 2 + (y1 - y2) ** 2)
+
+        # Penaliza la distancia si es menor a min_dist
+        if dist < min_dist:
+            return 1.0 - (dist / min_dist)
+        return 0
+
+    @staticmethod
+    def _penalizacion_np(x1, y1, x2, y2, min_dist=50):
+        """
+        Versión vectorizada de _penalizacion
 
-            # Penaliza la distancia si es menor a min_dist
-            if dist < min_dist:
-                total += (1.0 - (dist / min_dist))
-        return total
+        """
+        dist = np.sqrt((x1 - x2) ** 2 + (y1 - y2) ** 2)
+        return np.where(dist < min_dist, 1.0 - dist / min_dist, 0.0)
 
-    def angulo_aristas(self, estado_dic):
+    def angulo_aristas(self, estado):
         """
         A partir de una posicion "estado", devuelve una penalizacion
         proporcional a cada angulo entre aristas menor a pi/6 rad (30
@@ -258,10 +857,10 @@ class problema_grafica_grafo(blocales.Problema):
         penalización, y la penalizacion crece conforme el angulo es
         menor.
 
-        @param estado_dic: Diccionario cuyas llaves son los vértices
-                           del grafo y cuyos valores es una tupla con
-                           la posición (x, y) de ese vértice en el
-                           dibujo.
+        @param estado: Una tupla con las posiciones (x1, y1, x2, y2, ...)
+                       de cada vértice en el dibujo. Las aristas, como
+                       pares de índices de la coordenada x de sus
+                       vértices en el estado, están en self._aristas.
 
         @return: Un número.
 
@@ -280,15 +879,15 @@ class problema_grafica_grafo(blocales.Problema):
         #
         return 0
 
-    def criterio_propio(self, estado_dic):
+    def criterio_propio(self, estado):
         """
         Implementa y comenta correctamente un criterio de costo que sea
         conveniente para que un grafo luzca bien.
 
-        @param estado_dic: Diccionario cuyas llaves son los vértices
-                           del grafo y cuyos valores es una tupla con
-                           la posición (x, y) de ese vértice en el
-                           dibujo.
+        @param estado: Una tupla con las posiciones (x1, y1, x2, y2, ...)
+                       de cada vértice en el dibujo. Las aristas, como
+                       pares de índices de la coordenada x de sus
+                       vértices en el estado, están en self._aristas.
 
         @return: Un número.
 
@@ -310,7 +909,8 @@ class problema_grafica_grafo(blocales.Problema):
     def estado2dic(self, estado):
         """
         Convierte el estado en forma de tupla a un estado en forma
-        de diccionario
+        de diccionario. Solo se usa para dibujar, el costo lee las
+        posiciones directamente del estado.
 
         @param: Una tupla con las posiciones (x1, y1, x2, y2, ...)
 
@@ -334,21 +934,291 @@ class problema_grafica_grafo(blocales.Problema):
         """
         if not estado:
             estado = self.estado_aleatorio()
+        self.imagen(estado).save(filename)
+
+    def imagen(self, estado):
+        """
+        Dibuja el grafo en una imagen de Pillow, sin guardarla
+
+        @param estado: Una tupla con las posiciones (x1, y1, x2, y2, ...)
 
-        # Diccionario donde lugar[vertice] = (posX, posY)
-        lugar = self.estado2dic(estado)
+        @return: Un objeto Image de dimensión self.dim x self.dim
 
+        """
         # Abre una imagen y para dibujar en la imagen
         # Imagen en blanco
         imagen = Image.new('RGB', (self.dim, self.dim), (255, 255, 255))
         dibujar = ImageDraw.ImageDraw(imagen)
 
-        for (v1, v2) in self.aristas:
-            dibujar.line((lugar[v1], lugar[v2]), fill=(255, 0, 0))
-        for v in self.vertices:
-            dibujar.text(lugar[v], v, (0, 0, 0))
+        for (i, j) in self._aristas:
+            dibujar.line((estado[i], estado[i + 1], estado[j], estado[j + 1]),
+                         fill=(255, 0, 0))
+        for i, v in enumerate(self.vertices):
+            dibujar.text((estado[2 * i], estado[2 * i + 1]), str(v),
+                         (0, 0, 0))
+        return imagen
+
+
+class Trayectoria:
+    """
+    Animación (GIF) de la trayectoria de una búsqueda.
+
+    Los estados se agregan con agrega, por ejemplo con los avances de
+    blocales.itera_temple_simulado:
+
+        with Trayectoria(problema, "trayectoria.gif") as trayectoria:
+            for avance in blocales.itera_temple_simulado(problema, cada=100):
+                trayectoria.agrega(avance.mejor_estado)
 
-        imagen.save(filename)
+    De cada `cada` estados solo se dibuja uno, y cuando se juntan
+    max_cuadros cuadros se descarta uno de cada dos y se duplica `cada`,
+    por lo que la animación cubre toda la búsqueda con memoria acotada.
+    Los cuadros se dibujan en un hilo aparte: agrega solo pone el estado en
+    una cola y nunca espera, si la cola está llena el estado se descarta.
+
+    """
+    def __init__(self, problema, filename="trayectoria.gif", cada=1,
+                 max_cuadros=200, duracion=100, cola=64):
+        """
+        @param problema: Un problema_grafica_grafo.
+        @param filename: Nombre del GIF.
+        @param cada: Se dibuja uno de cada `cada` estados agregados.
+        @param max_cuadros: Número máximo de cuadros de la animación.
+        @param duracion: Duración de cada cuadro en milisegundos.
+        @param cola: Número máximo de estados esperando a ser dibujados.
+
+        """
+        self.problema = problema
+        self.filename = filename
+        self.cada = cada
+        self.max_cuadros = max(2, max_cuadros)
+        self.duracion = duracion
+        self.descartados = 0
+        self._agregados = 0
+        self._cuadros = []
+        self._cola = queue.Queue(cola)
+        self._hilo = threading.Thread(target=self._dibuja, daemon=True)
+        self._hilo.start()
+
+    def agrega(self, estado):
+        """
+        Agrega un estado a la trayectoria (sin esperar a que se dibuje)
+
+        """
+        self._agregados += 1
+        if (self._agregados - 1) % self.cada:
+            return
+        try:
+            self._cola.put_nowait(tuple(estado))
+        except queue.Full:
+            self.descartados += 1
+
+    def _dibuja(self):
+        """
+        Ciclo del hilo que dibuja: toma estados de la cola hasta recibir
+        None
+
+        """
+        while True:
+            estado = self._cola.get()
+            if estado is None:
+                return
+            self._cuadros.append(self.problema.imagen(estado))
+            if len(self._cuadros) >= self.max_cuadros:
+                del self._cuadros[1::2]
+                self.cada *= 2
+
+    def cierra(self, estado=None):
+        """
+        Termina de dibujar y guarda la animación
+
+        @param estado: Último estado a incluir siempre en la animación
+                       (por ejemplo, la solución), opcional.
+
+        """
+        if estado is not None:
+            self._cola.put(tuple(estado))
+        self._cola.put(None)
+        self._hilo.join()
+        if self._cuadros:
+            self._cuadros[0].save(self.filename, save_all=True,
+                                  append_images=self._cuadros[1:],
+                                  duration=self.duracion, loop=0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.cierra()
+
+
+def lee_aristas(archivo, binario=None):
+    """
+    Lee un grafo de un archivo de aristas, sin cargar el archivo completo
+    en memoria ni guardar las aristas como tuplas de cadenas.
+
+    En texto, cada línea tiene los nombres de los dos vértices de una
+    arista separados por espacios (las líneas vacías o que empiezan con #
+    se ignoran, así como las columnas después de la segunda). En binario,
+    el archivo es una secuencia de pares de enteros de 32 bits little
+    endian (los índices de los vértices, de 0 a n - 1), y se lee con mmap.
+
+    @param archivo: Ruta del archivo.
+    @param binario: Si el archivo es binario (por default, si su extensión
+                    es .bin).
+
+    @return: Una tupla (vertices, aristas), donde vertices es la lista de
+             nombres de los vértices y aristas un arreglo de NumPy de
+             enteros de tamaño (m, 2) con los índices de los extremos de
+             cada arista (sin NumPy, un array('i') con los índices
+             seguidos). Se puede pasar directamente a
+             problema_grafica_grafo.
+
+    """
+    if binario is None:
+        binario = archivo.endswith('.bin')
+    if binario and os.path.getsize(archivo) == 0:
+        return [], array('i') if np is None else np.empty((0, 2), np.int32)
+    if binario:
+        if np is not None:
+            aristas = np.memmap(archivo, dtype='<i4', mode='r').reshape(-1, 2)
+            n = int(aristas.max()) + 1
+        else:
+            aristas = array('i')
+            with open(archivo, 'rb') as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as datos:
+                aristas.frombytes(datos)
+            if sys.byteorder == 'big':
+                aristas.byteswap()
+            n = max(aristas) + 1
+        return [str(v) for v in range(n)], aristas
+
+    indice = {}
+    aristas = array('i')
+    with open(archivo) as f:
+        for linea in f:
+            campos = linea.split()
+            if len(campos) < 2 or campos[0].startswith('#'):
+                continue
+            for v in campos[:2]:
+                aristas.append(indice.setdefault(v, len(indice)))
+    if np is not None:
+        aristas = np.frombuffer(aristas, dtype=np.intc).reshape(-1, 2)
+    return list(indice), aristas
+
+
+def _indices_aristas(vertices, aristas):
+    """
+    Las aristas como una lista de pares de índices de sus vértices
+
+    @param aristas: Pares de vértices, o un arreglo de pares de índices
+                    como los de lee_aristas
+
+    """
+    if np is not None and isinstance(aristas, np.ndarray):
+        return [tuple(par) for par in aristas.reshape(-1, 2).tolist()]
+    if isinstance(aristas, array):
+        return list(zip(aristas[::2], aristas[1::2]))
+    indice = {v: i for i, v in enumerate(vertices)}
+    return [(indice[v1], indice[v2]) for (v1, v2) in aristas]
+
+
+def dibujo_multinivel(vertices, aristas, minimo=20, aceptacion=0.1,
+                      pasos=100, **opciones):
+    """
+    Dibuja un grafo grande por niveles: se contrae el grafo varias veces
+    uniendo los extremos de un apareamiento de aristas, hasta tener a lo
+    más `minimo` vértices. El grafo más pequeño se dibuja con el temple
+    simulado, y su dibujo se proyecta al nivel anterior (cada vértice en la
+    posición de su vértice contraído, más un desplazamiento aleatorio),
+    donde se refina con un temple simulado corto y a baja temperatura.
+
+    @param vertices: Lista con el nombre de los vertices.
+    @param aristas: Lista con pares de vertices (o arreglo de pares de
+                    índices, como en problema_grafica_grafo).
+    @param minimo: Número de vértices a partir del cual ya no se contrae.
+    @param aceptacion: Probabilidad inicial de aceptar un incremento en el
+                       refinamiento (ver blocales.calibra_temperatura).
+    @param pasos: Iteraciones del refinamiento por cada vértice del nivel.
+    @param opciones: Argumentos para problema_grafica_grafo (por ejemplo
+                     dimension_imagen o motor).
+
+    @return: Una tupla (problema, estado) con el problema_grafica_grafo
+             del grafo original y el estado encontrado.
+
+    """
+    niveles = [(len(vertices), _indices_aristas(vertices, aristas))]
+    padres = []
+    while niveles[-1][0] > minimo:
+        padre, n, contraidas = _contrae(*niveles[-1])
+        if n > 0.9 * niveles[-1][0]:
+            # Con pocas aristas el grafo ya casi no se contrae
+            break
+        padres.append(padre)
+        niveles.append((n, contraidas))
+
+    def problema_nivel(nivel):
+        if nivel == 0:
+            return problema_grafica_grafo(vertices, aristas, **opciones)
+        n, contraidas = niveles[nivel]
+        return problema_grafica_grafo(list(range(n)), contraidas,
+                                      **opciones)
+
+    problema = problema_nivel(len(niveles) - 1)
+    estado = blocales.temple_simulado(problema)
+    for nivel in reversed(range(len(padres))):
+        problema = problema_nivel(nivel)
+        proyectado = []
+        for v in range(niveles[nivel][0]):
+            x = 2 * padres[nivel][v]
+            proyectado.extend(
+                max(10, min(problema.dim - 10,
+                            valor + random.randint(-10, 10)))
+                for valor in estado[x:x + 2])
+        estado = _refina(problema, tuple(proyectado), aceptacion,
+                         pasos * len(problema.vertices))
+    return problema, estado
+
+
+def _contrae(n, aristas):
+    """
+    Contrae un grafo con vértices 0, ..., n - 1, uniendo los extremos de
+    cada arista de un apareamiento maximal aleatorio
+
+    @return: Una tupla (padre, m, contraidas), donde padre[v] es el vértice
+             del grafo contraído (entre 0 y m - 1) al que va v, y contraidas
+             las aristas del grafo contraído.
+
+    """
+    padre = [None] * n
+    m = 0
+    for (u, v) in random.sample(aristas, len(aristas)):
+        if u != v and padre[u] is None and padre[v] is None:
+            padre[u] = padre[v] = m
+            m += 1
+    for v in range(n):
+        if padre[v] is None:
+            padre[v] = m
+            m += 1
+    contraidas = {(min(padre[u], padre[v]), max(padre[u], padre[v]))
+                  for (u, v) in aristas if padre[u] != padre[v]}
+    return padre, m, sorted(contraidas)
+
+
+def _refina(problema, estado, aceptacion, iteraciones):
+    """
+    Temple simulado corto desde `estado`, con calendarización geométrica
+    de T_ini a T_ini / 100 en el número de iteraciones indicado
+
+    """
+    T_ini = blocales.calibra_temperatura(problema, aceptacion,
+                                         estado=estado)
+    if T_ini == 0:
+        return estado
+    return blocales.temple_simulado(
+        problema, blocales.calendario_geometrico(T_ini,
+                                                 0.01 ** (1 / iteraciones)),
+        tol=T_ini / 100, estado_inicial=estado)
 
 
 def main():
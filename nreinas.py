@@ -14,16 +14,38 @@ __author__ = 'juliowaissman'
 import blocales
 from random import shuffle
 from random import sample
+from random import Random
 from itertools import combinations
+from array import array
+from time import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 class ProblemaNreinas(blocales.Problema):
     """
     Las N reinas en forma de búsqueda local 
-    
+
+    El costo se calcula contando las reinas en cada diagonal, por lo que
+    evaluar un estado es O(n) y evaluar un intercambio es O(1).
+
     """
-    def __init__(self, n=8):
+    def __init__(self, n=8, aleatorio=None):
+        """
+        @param n: Número de reinas
+        @param aleatorio: Un blocales.Aleatorio del que se toman los
+                          vecinos y movimientos aleatorios (por default, del
+                          módulo random)
+
+        """
         self.n = n
+        self.aleatorio = aleatorio
+        # Contadores de reinas por diagonal del último estado movido
+        self._estado = None
+        self._diagonal = self._antidiagonal = None
 
     def estado_aleatorio(self):
         """
@@ -52,35 +74,297 @@ class ProblemaNreinas(blocales.Problema):
 
         """
         vecino = list(estado)
-        i, j = sample(range(self.n), 2)
+        i, j = self._par_aleatorio()
         vecino[i], vecino[j] = vecino[j], vecino[i]
         return tuple(vecino)
 
+    def movimientos(self, estado):
+        """
+        Generador de movimientos, todos los pares (i, j) de posiciones
+        a intercambiar
+
+        """
+        return combinations(range(self.n), 2)
+
+    def movimiento_aleatorio(self, estado):
+        """
+        Un par (i, j) de posiciones a intercambiar elegido al azar
+
+        """
+        return self._par_aleatorio()
+
+    def _par_aleatorio(self):
+        """
+        Dos posiciones distintas elegidas al azar, del módulo random o del
+        Aleatorio del problema
+
+        """
+        if self.aleatorio is None:
+            return tuple(sample(range(self.n), 2))
+        indice = self.aleatorio.enteros(0, self.n - 1)
+        i, j = indice(), indice()
+        while i == j:
+            j = indice()
+        return i, j
+
+    def delta_costo(self, estado, movimiento):
+        """
+        Cambio en el número de conflictos al intercambiar dos reinas, en
+        O(1) a partir de los contadores de diagonales del estado actual.
+
+        """
+        self._sincroniza(estado)
+        i, j = movimiento
+        vi, vj = estado[i], estado[j]
+        delta = self._mueve(i, vi, vj) + self._mueve(j, vj, vi)
+        self._mueve(j, vi, vj)
+        self._mueve(i, vj, vi)
+        return delta
+
+    def aplica_movimiento(self, estado, movimiento):
+        """
+        Intercambia las reinas en las posiciones del movimiento, y actualiza
+        los contadores de diagonales. Un estado mutable se modifica en su
+        lugar.
+
+        """
+        self._sincroniza(estado)
+        i, j = movimiento
+        vi, vj = estado[i], estado[j]
+        self._mueve(i, vi, vj)
+        self._mueve(j, vj, vi)
+        if type(estado) is tuple:
+            estado = list(estado)
+            estado[i], estado[j] = vj, vi
+            estado = tuple(estado)
+        else:
+            estado[i], estado[j] = vj, vi
+        self._estado = estado
+        return estado
+
+    def estado_mutable(self, estado):
+        """
+        El estado como un array('i'), que se modifica en su lugar
+
+        """
+        return array('i', estado)
+
+    def deshaz_movimiento(self, estado, movimiento):
+        """
+        Un intercambio se deshace volviendo a intercambiar
+
+        """
+        return self.aplica_movimiento(estado, movimiento)
+
     def costo(self, estado):
         """
         Calcula el costo de un estado por el número de conflictos entre reinas
 
+        Como el estado es una permutación, solo hay conflictos en las
+        diagonales, y en una diagonal con c reinas hay c(c-1)/2 conflictos.
+
+        """
+        diagonal, antidiagonal = self._diagonales(estado)
+        return sum(c * (c - 1) // 2 for c in diagonal + antidiagonal)
+
+    def cambios(self, estado, movimiento):
+        """
+        Un intercambio (i, j) cambia los valores de las posiciones i y j
+
+        """
+        i, j = movimiento
+        return (i, estado[i], estado[j]), (j, estado[j], estado[i])
+
+    def costo_lote(self, estados):
+        """
+        Calcula el costo de varios estados a la vez. Con NumPy, las reinas
+        por diagonal de todos los estados se cuentan con un solo bincount.
+
+        @param estados: Un arreglo de dos dimensiones, o una lista de
+                        tuplas, con un estado por renglón
+
+        @return: Una lista con el costo de cada estado
+
+        """
+        if np is None:
+            return super().costo_lote(estados)
+        e = np.asarray(estados, dtype=np.intp)
+        m, d = len(e), 2 * self.n + 1
+        desplazamiento = (np.arange(m) * d)[:, None]
+        i = np.arange(self.n)
+        costos = 0
+        for indices in (i - e + self.n, i + e):
+            c = np.bincount((indices + desplazamiento).ravel(),
+                            minlength=m * d).reshape(m, d)
+            costos = costos + (c * (c - 1) // 2).sum(axis=1)
+        return costos.tolist()
+
+    def cruza(self, estado1, estado2):
+        """
+        Cruza por orden: el hijo toma de estado1 las reinas de un segmento
+        al azar, y llena el resto de las posiciones con los valores que
+        faltan, en el orden en que aparecen en estado2. Así el hijo sigue
+        siendo una permutación.
+
+        """
+        i, j = sorted(sample(range(self.n + 1), 2))
+        segmento = set(estado1[i:j])
+        resto = iter([v for v in estado2 if v not in segmento])
+        return tuple(estado1[k] if i <= k < j else next(resto)
+                     for k in range(self.n))
+
+    def _diagonales(self, estado):
+        """
+        Cuenta las reinas en cada diagonal y en cada antidiagonal
+
+        @return: Dos listas, el número de reinas en la diagonal i - estado[i]
+                 (desplazada por n) y en la antidiagonal i + estado[i].
+
+        """
+        diagonal = [0] * (2 * self.n + 1)
+        antidiagonal = [0] * (2 * self.n + 1)
+        for i, valor in enumerate(estado):
+            diagonal[i - valor + self.n] += 1
+            antidiagonal[i + valor] += 1
+        return diagonal, antidiagonal
+
+    def _sincroniza(self, estado):
+        """
+        Reconstruye los contadores de diagonales si `estado` no es el último
+        estado que se movió
+
         """
-        return sum(
-            abs(estado[i] - estado[j]) == abs(i - j)
-            for (i, j) in combinations(range(self.n), 2)
-        )
+        if estado is not self._estado:
+            self._diagonal, self._antidiagonal = self._diagonales(estado)
+            self._estado = estado
+
+    def _mueve(self, i, anterior, nuevo):
+        """
+        Mueve en los contadores la reina de la posición i del valor
+        `anterior` al valor `nuevo`.
+
+        @return: El cambio en el número de conflictos
+
+        """
+        diagonal, antidiagonal = self._diagonal, self._antidiagonal
+        diagonal[i - anterior + self.n] -= 1
+        antidiagonal[i + anterior] -= 1
+        delta = -(diagonal[i - anterior + self.n] +
+                  antidiagonal[i + anterior])
+        delta += diagonal[i - nuevo + self.n] + antidiagonal[i + nuevo]
+        diagonal[i - nuevo + self.n] += 1
+        antidiagonal[i + nuevo] += 1
+        return delta
+
+
+def min_conflictos(n, maxit=None, intentos=32, semilla=None):
+    """
+    Resuelve las n reinas por mínimos conflictos, con memoria O(n).
+
+    El estado es una permutación en un `array('i')` con contadores de
+    reinas por diagonal. Primero se colocan las reinas una a una,
+    intercambiando la reina i con alguna j >= i elegida al azar que no
+    tenga conflictos (a lo más `intentos` veces). Después se reparan los
+    conflictos restantes: se toma una reina en conflicto de la lista de
+    pendientes y se intercambia con otra al azar si eso no aumenta el número
+    de conflictos. La lista de pendientes se actualiza con cada intercambio,
+    y las reinas que dejaron de estar en conflicto se descartan al sacarlas.
+
+    Si la reparación se estanca (lo que solo ocurre en tableros pequeños),
+    se vuelven a colocar las reinas a partir del estado actual.
+
+    @param n: Número de reinas
+    @param maxit: Máximo número de intentos de reparación (por default
+                  100n, y al menos 100000)
+    @param intentos: Intentos para colocar cada reina sin conflictos
+    @param semilla: Semilla del generador de números aleatorios
 
+    @return: Un `array('i')` con el estado encontrado (valores 1 a n). Si
+             se agotan las iteraciones puede tener conflictos.
 
-def prueba_descenso_colinas(pbl=ProblemaNreinas(8), rep=10):
-    """ Prueba el algoritmo de descenso de colinas con n repeticiones """
+    """
+    aleatorio = Random(semilla).random
+    maxit = max(100 * n, 100000) if maxit is None else int(maxit)
+    ronda = 10 * n
+
+    estado = array('i', range(1, n + 1))
+    diagonal = array('i', [0]) * (2 * n + 1)
+    antidiagonal = array('i', [0]) * (2 * n + 1)
+
+    def en_conflicto(i):
+        v = estado[i]
+        return diagonal[i - v + n] > 1 or antidiagonal[i + v] > 1
+
+    def mueve(i, anterior, nuevo):
+        diagonal[i - anterior + n] -= 1
+        antidiagonal[i + anterior] -= 1
+        delta = (diagonal[i - nuevo + n] + antidiagonal[i + nuevo] -
+                 diagonal[i - anterior + n] - antidiagonal[i + anterior])
+        diagonal[i - nuevo + n] += 1
+        antidiagonal[i + nuevo] += 1
+        return delta
+
+    while True:
+        # Colocación inicial
+        for k in range(2 * n + 1):
+            diagonal[k] = antidiagonal[k] = 0
+        for i in range(n):
+            for _ in range(intentos):
+                j = i + int(aleatorio() * (n - i))
+                v = estado[j]
+                if diagonal[i - v + n] == 0 and antidiagonal[i + v] == 0:
+                    break
+            estado[i], estado[j] = v, estado[i]
+            diagonal[i - v + n] += 1
+            antidiagonal[i + v] += 1
+
+        # Reparación
+        pendientes = [i for i in range(n) if en_conflicto(i)]
+        en_pendientes = bytearray(n)
+        for i in pendientes:
+            en_pendientes[i] = 1
+
+        for _ in range(min(ronda, maxit)):
+            maxit -= 1
+            if not pendientes:
+                return estado
+            k = int(aleatorio() * len(pendientes))
+            pendientes[k], pendientes[-1] = pendientes[-1], pendientes[k]
+            i = pendientes[-1]
+            if not en_conflicto(i):
+                pendientes.pop()
+                en_pendientes[i] = 0
+                continue
+
+            j = int(aleatorio() * n)
+            vi, vj = estado[i], estado[j]
+            if i == j or mueve(i, vi, vj) + mueve(j, vj, vi) > 0:
+                if i != j:
+                    mueve(j, vi, vj)
+                    mueve(i, vj, vi)
+                continue
+            estado[i], estado[j] = vj, vi
+            if not en_pendientes[j] and en_conflicto(j):
+                pendientes.append(j)
+                en_pendientes[j] = 1
+
+        if maxit <= 0 or not any(map(en_conflicto, pendientes)):
+            return estado
+
+
+def prueba_descenso_colinas(pbl=ProblemaNreinas(8), rep=10, procesos=None):
+    """
+    Prueba el algoritmo de descenso de colinas con n repeticiones,
+    ejecutadas en paralelo
 
+    """
     print("\n\n" + "intento".center(10) + "costo".center(10))
-    
-    c = 1e10
-    for intento in range(rep):
-        solucion = blocales.descenso_colinas(pbl)
-        c_intento = pbl.costo(solucion)
+
+    mejor_solucion, intentos = blocales.reinicios_paralelos(
+        pbl, blocales.descenso_colinas, rep, procesos)
+    for intento, estadistica in enumerate(intentos):
         print(str(intento).center(10) +
-              str(c_intento).center(10))
-        if c_intento < c:
-            mejor_solucion = solucion
-            c = c_intento
+              str(estadistica['costo']).center(10))
     print("\n\nEl mejor estado encontrado es:")
     print(mejor_solucion)
 
@@ -95,8 +379,32 @@ def prueba_temple_simulado(problema=ProblemaNreinas(8)):
     print(solucion)
 
 
+def prueba_busqueda_tabu(problema=ProblemaNreinas(8)):
+    """ Prueba el algoritmo de búsqueda tabú """
+
+    solucion = blocales.busqueda_tabu(
+        problema, parada=blocales.ParadaCostoObjetivo(0))
+    print("\n\nBúsqueda tabú.")
+    print("Costo de la solución: ", problema.costo(solucion))
+    print("Y la solución es: ")
+    print(solucion)
+
+
+def prueba_min_conflictos(n=1000000):
+    """ Prueba el algoritmo de mínimos conflictos """
+
+    t_inicial = time()
+    solucion = min_conflictos(n)
+    t_final = time()
+    print("\n\nMínimos conflictos con {} reinas.".format(n))
+    print("Costo de la solución: ", ProblemaNreinas(n).costo(solucion))
+    print("Tiempo de ejecución en segundos: ", t_final - t_inicial)
+
+
 if __name__ == "__main__":
 
-    prueba_descenso_colinas(ProblemaNreinas(50), 10)
-    prueba_temple_simulado(ProblemaNreinas(50))
+    prueba_descenso_colinas(ProblemaNreinas(200), 10)
+    prueba_temple_simulado(ProblemaNreinas(1000))
+    prueba_busqueda_tabu(ProblemaNreinas(50))
+    prueba_min_conflictos(1000000)
 
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+prueba_dibuja_grafo.py
+------------
+
+Revisa que el delta_costo de problema_grafica_grafo coincida con la
+diferencia de costos calculados completos. No corre con el programa
+principal de dibuja_grafo, sino por separado:
+
+$python prueba_dibuja_grafo.py
+$python prueba_dibuja_grafo.py -n 50 -a 120 --pasos 1000
+
+"""
+
+import argparse
+import itertools
+import random
+import sys
+
+import dibuja_grafo
+from bench_blocales import grafo_aleatorio
+
+
+def prueba_delta_costo(n_vertices=20, n_aristas=40, pasos=300, semilla=0):
+    """
+    Revisa que delta_costo coincida exactamente con la diferencia de costo
+    calculada completa, en una caminata aleatoria sobre un grafo aleatorio,
+    con cada motor ('python', 'numpy' si está instalado, y 'rejilla'),
+    con estados en tupla y mutables, y con distintos factores de los
+    criterios (incluidos factores cero y K2 distinto de cero).
+
+    En cada paso el movimiento se aplica o se rechaza al azar, para revisar
+    también que las tablas de cruces y la rejilla sigan al estado.
+
+    @raise AssertionError: Si algún delta o costo no coincide
+
+    """
+    generador = random.Random(semilla)
+    vertices, aristas = grafo_aleatorio(n_vertices, n_aristas, semilla)
+
+    motores = ['python', 'rejilla']
+    if dibuja_grafo.np is not None:
+        motores.append('numpy')
+    for motor, pesos, mutable in itertools.product(
+            motores,
+            [(1.0, 0.0, 0.0, 0.0), (1.0, 1.0, 1.0, 1.0), (0.0, 2.0, 0.0, 0.5)],
+            [False, True]):
+        random.seed(semilla)
+        problema = dibuja_grafo.problema_grafica_grafo(
+            vertices, aristas, motor=motor, pesos=pesos, dmax=60)
+        # La referencia solo calcula costos completos
+        referencia = dibuja_grafo.problema_grafica_grafo(vertices, aristas,
+                                                         pesos=pesos)
+        estado = problema.estado_aleatorio()
+        if mutable:
+            estado = problema.estado_mutable(estado)
+        for paso in range(pasos):
+            movimiento = problema.movimiento_aleatorio(estado)
+            delta = problema.delta_costo(estado, movimiento)
+            vecino = list(estado)
+            for i, _, nuevo in problema.cambios(estado, movimiento):
+                vecino[i] = nuevo
+            esperado = (referencia.costo(tuple(vecino)) -
+                        referencia.costo(tuple(estado)))
+            if abs(delta - esperado) > 1e-6 * max(1.0, abs(esperado)):
+                raise AssertionError(
+                    "motor {}, pesos {}, mutable {}, paso {}: delta_costo {} "
+                    "en lugar de {}".format(motor, pesos, mutable, paso,
+                                            delta, esperado))
+            if generador.random() < 0.5:
+                estado = problema.aplica_movimiento(estado, movimiento)
+        costo = problema.costo(tuple(estado))
+        esperado = referencia.costo(tuple(estado))
+        if abs(costo - esperado) > 1e-6 * max(1.0, abs(esperado)):
+            raise AssertionError(
+                "motor {}, pesos {}, mutable {}: costo final {} en lugar "
+                "de {}".format(motor, pesos, mutable, costo, esperado))
+
+
+def main(argumentos=None):
+    """
+    La función principal
+
+    """
+    parser = argparse.ArgumentParser(
+        description="Prueba de delta_costo del dibujo de grafos")
+    parser.add_argument('-n', type=int, default=20,
+                        help='Número de vértices del grafo aleatorio')
+    parser.add_argument('-a', '--aristas', type=int, default=40,
+                        help='Número de aristas del grafo aleatorio')
+    parser.add_argument('--pasos', type=int, default=300)
+    parser.add_argument('--semilla', type=int, default=0)
+    args = parser.parse_args(argumentos)
+
+    try:
+        prueba_delta_costo(args.n, args.aristas, args.pasos, args.semilla)
+    except AssertionError as error:
+        print("Falla: {}".format(error))
+        return 1
+    print("delta_costo coincide con el costo completo")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())